@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -86,7 +87,39 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+    },
+    # Import workers write through their own connection so long-running
+    # imports do not hold up request-serving reads. IMMEDIATE transactions
+    # take the write lock up front and wait on busy_timeout instead of
+    # failing with "database is locked" when a read upgrades to a write.
+    "import": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+        "TEST": {"MIRROR": "default"},
+    },
+}
+
+# With POSTGRES_HOST set (as in CI), both aliases use PostgreSQL instead.
+if os.environ.get("POSTGRES_HOST"):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("POSTGRES_DB", "django_excel_import"),
+        "USER": os.environ.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ["POSTGRES_HOST"],
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
     }
+    DATABASES["import"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+# Applied to every SQLite connection when it is opened (see utils/db.py).
+SQLITE_PRAGMAS = {
+    "busy_timeout": 5000,
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative values are KiB
+    "temp_store": "memory",
 }
 
 
@@ -153,3 +186,33 @@ REST_FRAMEWORK = {
     "TRAILING_SLASH": False,
 }
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Importer
+IMPORT_LOG_BUFFER_SIZE = 500
+IMPORT_WORKER_CONCURRENCY = 2
+IMPORT_MAX_WORKER_CONCURRENCY = 8
+IMPORT_STALE_JOB_TIMEOUT = 600
+IMPORT_HEARTBEAT_SECONDS = 30  # well under the stale timeout
+IMPORT_MAX_JOB_ATTEMPTS = 3
+IMPORT_PARALLEL_WORKERS = 1
+IMPORT_PARTITION_SIZE = 10000
+IMPORT_VALIDATION_MODE = "rows"  # or "columnar" to validate chunks with pandas
+IMPORT_MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+IMPORT_XLSX_READER = "openpyxl"  # or "stream" to parse the sheet XML directly
+IMPORT_MEMORY_BUDGET_MB = None  # e.g. 256 to cap buffers and log peak memory per job
+IMPORT_MEMORY_ROW_BUFFER = 1000
+IMPORT_MEMORY_TRACE = False  # True to report the top Python allocators per job
+IMPORT_CHUNK_SIZE = 100  # rows in the first chunk
+IMPORT_ADAPTIVE_CHUNK_SIZE = True  # resize chunks towards the latency target
+IMPORT_CHUNK_TARGET_SECONDS = 0.5
+IMPORT_MIN_CHUNK_SIZE = 10
+IMPORT_MAX_CHUNK_SIZE = 5000
+IMPORT_CHUNK_RETRIES = 2  # retries of a chunk after a lock timeout or deadlock
+IMPORT_DATABASE_ALIAS = "import"
+IMPORT_DEFAULT_ENGINE = "orm"  # or "copy" for PostgreSQL COPY staging
+IMPORT_WARNING_LOGS = "summary"  # or "rows" for one warning entry per row
+IMPORT_EVENTS_POLL_SECONDS = 1.0  # shared by every event stream in a process
+IMPORT_EVENTS_KEEPALIVE_SECONDS = 15
+IMPORT_EVENTS_ERROR_SAMPLES = 20  # most errors sent per job and poll
+IMPORT_RESPONSE_CACHE_SIZE = 256  # completed job responses kept per process
+IMPORT_RESPONSE_CACHE_TTL = 300
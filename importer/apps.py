@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
 
 
 class ImporterConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'importer'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "importer"
+
+    def ready(self):
+        from utils.db import apply_sqlite_pragmas
+
+        from .checks import check_upload_storage
+
+        connection_created.connect(
+            apply_sqlite_pragmas, dispatch_uid="importer.apply_sqlite_pragmas"
+        )
+        checks.register(check_upload_storage)
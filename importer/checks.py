@@ -0,0 +1,16 @@
+from django.core.checks import Error
+
+from .uploads import storage_has_paths
+
+
+def check_upload_storage(app_configs, **kwargs):
+    if storage_has_paths():
+        return []
+    return [
+        Error(
+            "The default file storage has no local paths.",
+            hint="Imports stream uploads straight to disk; use a "
+            "FileSystemStorage for the default storage.",
+            id="importer.E001",
+        )
+    ]
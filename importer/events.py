@@ -0,0 +1,160 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import ImportJob, ImportLog
+from .serializers import ImportJobProgressSerializer, ImportLogSerializer
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class JobEventHub:
+    # One per process and event loop. However many clients stream a job's
+    # events, a single task polls the progress the workers commit with every
+    # chunk: one query for all watched jobs per interval, plus one for new
+    # errors of jobs whose error_count went up. Each client gets a queue of
+    # event batches.
+
+    def __init__(self, interval, error_samples):
+        self.interval = interval
+        self.error_samples = error_samples
+        self.subscribers = {}
+        self.latest = {}
+        self._state = {}
+        self._task = None
+
+    def subscribe(self, job_id):
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(job_id, set()).add(queue)
+        if job_id in self.latest:
+            # The job is already watched; start the client from its last
+            # known progress instead of waiting for it to change.
+            queue.put_nowait([self.latest[job_id]])
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, job_id, queue):
+        queues = self.subscribers.get(job_id, set())
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(job_id, None)
+            self.latest.pop(job_id, None)
+
+    async def _run(self):
+        while self.subscribers:
+            job_ids = list(self.subscribers)
+            events = await sync_to_async(self._poll)(job_ids)
+            for job_id, batch in events.items():
+                if job_id not in self.subscribers:
+                    continue
+                for event in batch:
+                    if event[0] == "progress":
+                        self.latest[job_id] = event
+                for queue in self.subscribers[job_id]:
+                    queue.put_nowait(batch)
+            await asyncio.sleep(self.interval)
+        self._state.clear()
+
+    def _poll(self, job_ids):
+        # Runs in a thread. Returns {job_id: [(event, data), ...]} for the
+        # jobs that changed since the last poll.
+        for job_id in set(self._state) - set(job_ids):
+            del self._state[job_id]
+
+        events = {}
+        jobs = {job.pk: job for job in ImportJob.objects.filter(pk__in=job_ids)}
+        for job_id in job_ids:
+            job = jobs.get(job_id)
+            if job is None:
+                events[job_id] = [("end", {"status": None})]
+                continue
+
+            batch = []
+            updated_at, error_count, error_cursor = self._state.get(
+                job_id, (None, None, None)
+            )
+            if error_count is None:
+                # Errors logged before the client connected are listed by
+                # the logs endpoint; only new ones are streamed.
+                error_cursor = self._last_error(job)
+            elif job.error_count > error_count:
+                errors = list(self._errors_after(job, error_cursor))
+                if errors:
+                    error_cursor = (errors[-1].created_at, errors[-1].pk)
+                    batch.append(
+                        ("errors", ImportLogSerializer(errors, many=True).data)
+                    )
+
+            if job.updated_at != updated_at:
+                batch.append(("progress", ImportJobProgressSerializer(job).data))
+            if job.status in FINISHED_STATUSES:
+                batch.append(("end", {"status": job.status}))
+
+            self._state[job_id] = (job.updated_at, job.error_count, error_cursor)
+            if batch:
+                events[job_id] = batch
+        return events
+
+    def _last_error(self, job):
+        return (
+            ImportLog.objects.filter(job=job, log_type="error")
+            .order_by("-created_at", "-id")
+            .values_list("created_at", "id")
+            .first()
+        )
+
+    def _errors_after(self, job, cursor):
+        # Keyed on (created_at, id) like the logs endpoint, so while a
+        # parallel job runs, an error a slower partition commits behind the
+        # cursor is not sampled. error_count in "progress" still counts it.
+        errors = ImportLog.objects.filter(job=job, log_type="error")
+        if cursor is not None:
+            created_at, pk = cursor
+            errors = errors.filter(created_at__gte=created_at).exclude(
+                created_at=created_at, id__lte=pk
+            )
+        return errors.order_by("created_at", "id")[: self.error_samples]
+
+
+_hubs = {}
+
+
+def get_hub():
+    # Hubs belong to the event loop their polling task runs on.
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        _hubs.clear()
+        _hubs[loop] = JobEventHub(
+            interval=getattr(settings, "IMPORT_EVENTS_POLL_SECONDS", 1.0),
+            error_samples=getattr(settings, "IMPORT_EVENTS_ERROR_SAMPLES", 20),
+        )
+    return _hubs[loop]
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def stream_job_events(job_id):
+    keepalive = getattr(settings, "IMPORT_EVENTS_KEEPALIVE_SECONDS", 15)
+    hub = get_hub()
+    queue = hub.subscribe(job_id)
+    try:
+        while True:
+            try:
+                batch = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection.
+                yield ": keepalive\n\n"
+                continue
+
+            for event, data in batch:
+                yield format_event(event, data)
+                if event == "end":
+                    return
+    finally:
+        hub.unsubscribe(job_id, queue)
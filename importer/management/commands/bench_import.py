@@ -0,0 +1,184 @@
+import json
+import os
+import tempfile
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from importer.models import ImportJob
+from products.models import Product
+from utils.excel_processor import ExcelProductProcessor
+from utils.memory import peak_rss_bytes, reset_peak_rss
+from utils.synthetic_feed import FEED_FORMATS, SyntheticFeed, sku_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic product feeds, import them end to end into a "
+        "throwaway test database and report throughput as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=[10000],
+            help="Data rows per generated feed, e.g. --rows 10000 100000 1000000",
+        )
+        parser.add_argument("--format", choices=FEED_FORMATS, default="xlsx")
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.01,
+            help="Fraction of rows missing a required field",
+        )
+        parser.add_argument(
+            "--warning-rate",
+            type=float,
+            default=0.05,
+            help="Fraction of rows missing a recommended field",
+        )
+        parser.add_argument(
+            "--duplicate-ratio",
+            type=float,
+            default=0.01,
+            help="Fraction of rows repeating an earlier SKU",
+        )
+        parser.add_argument(
+            "--update-ratio",
+            type=float,
+            default=0.5,
+            help="Fraction of SKUs that already exist with different values",
+        )
+        parser.add_argument(
+            "--database",
+            action="append",
+            help="DATABASES alias to benchmark against (repeatable, e.g. a "
+            "local Postgres alias); a test database is created and destroyed "
+            "for each run",
+        )
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        results = []
+        for alias in options["database"] or ["default"]:
+            for rows in options["rows"]:
+                results.append(self.run(alias, rows, options))
+                self.stderr.write(
+                    f"{alias} {rows} rows: {results[-1]['rows_per_second']} rows/s"
+                )
+
+        report = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report + "\n")
+        else:
+            self.stdout.write(report)
+
+    def run(self, alias, rows, options):
+        feed = SyntheticFeed(
+            rows,
+            error_rate=options["error_rate"],
+            warning_rate=options["warning_rate"],
+            duplicate_ratio=options["duplicate_ratio"],
+            seed=options["seed"],
+        )
+        name = default_storage.get_available_name(
+            f"imports/bench-{rows}.{options['format']}"
+        )
+        os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+
+        started = time.perf_counter()
+        feed.write(default_storage.path(name), options["format"])
+        generate_seconds = time.perf_counter() - started
+
+        connection = connections[alias]
+        with tempfile.TemporaryDirectory(prefix="bench-import-") as db_dir:
+            if connection.vendor == "sqlite":
+                # A file database, so forked partition workers share it and
+                # the numbers include real disk writes.
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                    db_dir, "bench.sqlite3"
+                )
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+            try:
+                self.seed_products(alias, rows, options["update_ratio"])
+                job = ImportJob.objects.using(alias).create(file=name)
+
+                reset_peak_rss()
+                started = time.perf_counter()
+                ExcelProductProcessor(
+                    job.id, workers=options["workers"], using=alias
+                ).process()
+                seconds = time.perf_counter() - started
+                job.refresh_from_db()
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                default_storage.delete(name)
+
+        stages = job.profile["stages"]
+        queries = sum(stats["queries"] for stats in stages.values())
+        return {
+            "database": alias,
+            "vendor": connection.vendor,
+            "format": options["format"],
+            "rows": rows,
+            "workers": options["workers"] or 1,
+            "status": job.status,
+            "generate_seconds": round(generate_seconds, 3),
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(job.total_rows / seconds, 1) if seconds else None,
+            "queries": queries,
+            "queries_per_row": (
+                round(queries / job.total_rows, 4) if job.total_rows else None
+            ),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "worker_peak_rss_bytes": job.profile.get("worker_peak_rss_bytes"),
+            "counts": {
+                "total": job.total_rows,
+                "success": job.success_count,
+                "unchanged": job.unchanged_count,
+                "warning": job.warning_count,
+                "error": job.error_count,
+            },
+            "chunk_sizes": job.profile["chunk_sizes"],
+            "stages": {
+                stage: {
+                    "wall": stats["wall"],
+                    "cpu": stats["cpu"],
+                    "queries": stats["queries"],
+                    "query_time": stats["query_time"],
+                }
+                for stage, stats in stages.items()
+            },
+        }
+
+    def seed_products(self, alias, rows, update_ratio):
+        # Existing products with stale values, so that share of the feed is
+        # written as updates and the rest as inserts.
+        existing = int(rows * update_ratio)
+        for start in range(0, existing, 5000):
+            Product.objects.using(alias).bulk_create(
+                [
+                    Product(
+                        sku=sku_for(number),
+                        title="Stale title",
+                        description="Stale description",
+                        link=f"https://shop.example.com/p/{number}",
+                        image_link=f"https://cdn.example.com/p/{number}.jpg",
+                        availability="in stock",
+                        price="1.00",
+                        condition="new",
+                        brand="Acme",
+                        gtin="0",
+                    )
+                    for number in range(start, min(start + 5000, existing))
+                ]
+            )
@@ -0,0 +1,216 @@
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from rest_framework.test import APIRequestFactory
+
+from importer.models import ImportJob, ImportLog
+from importer.views import ImportJobLogListView
+from utils.common import uuid7
+
+KEYS = {"uuid4": uuid4, "uuid7": uuid7}
+INDEX_LAYOUTS = ["job", "composite"]
+MESSAGES = {
+    "error": "Missing required field: title",
+    "warning": "Missing recommended field: color",
+    "info": "Import started",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill a throwaway test database with import logs and report insert and "
+        "log page latency as JSON, per primary key type and index layout"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=[1000000],
+            help="Log rows per run, e.g. --rows 1000000 10000000",
+        )
+        parser.add_argument(
+            "--key",
+            choices=KEYS,
+            action="append",
+            help="Primary key generator (repeatable, default: both)",
+        )
+        parser.add_argument(
+            "--indexes",
+            choices=INDEX_LAYOUTS,
+            action="append",
+            help="'job' is the single foreign key index logs used to have, "
+            "'composite' the current indexes (repeatable, default: both)",
+        )
+        parser.add_argument(
+            "--jobs", type=int, default=100, help="Jobs the logs are spread over"
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Timed fetches per page query"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        results = []
+        for rows in options["rows"]:
+            for key in options["key"] or list(KEYS):
+                for layout in options["indexes"] or INDEX_LAYOUTS:
+                    results.append(self.run(rows, key, layout, options))
+                    self.stderr.write(
+                        f"{rows} rows, {key}, {layout} indexes: "
+                        f"{results[-1]['insert']['rows_per_second']} rows/s"
+                    )
+
+        report = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(report + "\n")
+        else:
+            self.stdout.write(report)
+
+    def run(self, rows, key, layout, options):
+        # The logs endpoint reads through the default alias.
+        alias = DEFAULT_DB_ALIAS
+        connection = connections[alias]
+        with tempfile.TemporaryDirectory(prefix="bench-logs-") as db_dir:
+            if connection.vendor == "sqlite":
+                connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                    db_dir, "bench.sqlite3"
+                )
+            old_name = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+            try:
+                if layout == "job":
+                    self.use_job_index(connection)
+                jobs = [
+                    ImportJob.objects.using(alias).create(file="imports/bench.xlsx")
+                    for _ in range(options["jobs"])
+                ]
+                insert = self.insert_logs(alias, jobs, rows, KEYS[key], options)
+                pages = self.fetch_pages(alias, jobs[len(jobs) // 2], options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        return {
+            "vendor": connection.vendor,
+            "rows": rows,
+            "key": key,
+            "indexes": layout,
+            "insert": insert,
+            "pages": pages,
+        }
+
+    def use_job_index(self, connection):
+        # The layout before the composite indexes: only the foreign key index.
+        with connection.schema_editor() as editor:
+            for index in ImportLog._meta.indexes:
+                editor.remove_index(ImportLog, index)
+            editor.add_index(
+                ImportLog, models.Index(fields=["job"], name="bench_importlog_job")
+            )
+
+    def insert_logs(self, alias, jobs, rows, key, options):
+        # Logs are written job after job in batches, as the importer does.
+        rng = random.Random(options["seed"])
+        per_job = -(-rows // len(jobs))
+        batch_seconds = []
+        written = 0
+        for job in jobs:
+            row_number = 1
+            while row_number <= per_job and written < rows:
+                count = min(options["batch_size"], per_job - row_number + 1)
+                count = min(count, rows - written)
+                batch = []
+                for number in range(row_number + 1, row_number + count + 1):
+                    roll = rng.random()
+                    log_type = (
+                        "error" if roll < 0.15 else "info" if roll < 0.2 else "warning"
+                    )
+                    batch.append(
+                        ImportLog(
+                            id=key(),
+                            job=job,
+                            log_type=log_type,
+                            row_number=number,
+                            message=MESSAGES[log_type],
+                        )
+                    )
+
+                started = time.perf_counter()
+                with transaction.atomic(using=alias):
+                    ImportLog.objects.using(alias).bulk_create(batch)
+                batch_seconds.append(time.perf_counter() - started)
+                row_number += count
+                written += count
+
+        # Latency of the last tenth of the batches shows how inserts slow
+        # down as the table outgrows the cache.
+        tail = batch_seconds[-max(1, len(batch_seconds) // 10) :]
+        return {
+            "seconds": round(sum(batch_seconds), 3),
+            "rows_per_second": round(rows / sum(batch_seconds), 1),
+            "batch_ms_p50": round(statistics.median(batch_seconds) * 1000, 3),
+            "batch_ms_p95": round(_percentile(batch_seconds, 0.95) * 1000, 3),
+            "batch_ms_last_tenth": round(statistics.mean(tail) * 1000, 3),
+        }
+
+    def fetch_pages(self, alias, job, options):
+        factory = APIRequestFactory(SERVER_NAME="localhost")
+        view = ImportJobLogListView.as_view()
+        url = f"/api/import/{job.id}/logs"
+        logs = ImportLog.objects.using(alias).filter(job=job)
+        middle = logs.order_by("created_at", "id")[logs.count() // 2]
+
+        def endpoint(**params):
+            def fetch():
+                response = view(factory.get(url, params), pk=job.id)
+                assert response.status_code == 200, response.data
+                response.render()
+
+            return fetch
+
+        def offset_page():
+            # What the detail endpoint did before logs got their own
+            # endpoint: count the job's logs, then OFFSET into them.
+            logs.count()
+            list(logs.order_by("created_at")[logs.count() // 2 :][:10])
+
+        cursor = view.view_class.pagination_class().encode_cursor(middle)
+        queries = {
+            "first_page": endpoint(),
+            "middle_page": endpoint(cursor=cursor),
+            "errors_in_row_range": endpoint(
+                log_type="error", row_from=1000, row_to=2000
+            ),
+            "count_and_offset": offset_page,
+        }
+
+        pages = {}
+        for name, fetch in queries.items():
+            fetch()
+            timings = []
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                fetch()
+                timings.append(time.perf_counter() - started)
+            pages[name] = {
+                "ms_p50": round(statistics.median(timings) * 1000, 3),
+                "ms_p95": round(_percentile(timings, 0.95) * 1000, 3),
+            }
+        return pages
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
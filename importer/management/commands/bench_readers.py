@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.readers import READERS
+
+
+class Command(BaseCommand):
+    help = "Time each xlsx reader engine on a file and check they yield the same rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the .xlsx file to read")
+        parser.add_argument(
+            "--engine",
+            action="append",
+            choices=sorted(READERS),
+            help="Reader engine to benchmark (repeatable, defaults to all)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            help="Number of passes per engine; the fastest one is reported",
+        )
+
+    def handle(self, *args, **options):
+        engines = options["engine"] or sorted(READERS)
+        repeat = max(1, options["repeat"])
+        reference = None
+
+        for engine in engines:
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                with READERS[engine](options["path"]) as reader:
+                    rows = list(reader.iter_rows())
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            data_rows = max(len(rows) - 1, 0)
+            self.stdout.write(
+                f"{engine}: {data_rows} rows in {best:.3f}s "
+                f"({data_rows / best if best else 0:,.0f} rows/s)"
+            )
+
+            if reference is None:
+                reference = (engine, rows)
+            elif rows != reference[1]:
+                raise CommandError(f"{engine} rows differ from {reference[0]} rows")
@@ -0,0 +1,84 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from importer.queue import recover_stale_jobs, work
+
+
+def _run_worker(stop_event, poll_interval):
+    # The parent owns shutdown: it sets stop_event and each worker exits once
+    # its current job is finished.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    try:
+        work(stop_event, poll_interval)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that claim and process pending import jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "IMPORT_WORKER_CONCURRENCY", 2),
+            help="Number of worker processes to run on this node",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds an idle worker waits before polling for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        max_concurrency = getattr(settings, "IMPORT_MAX_WORKER_CONCURRENCY", 8)
+        concurrency = max(1, min(options["concurrency"], max_concurrency))
+        poll_interval = options["poll_interval"]
+        recovery_interval = getattr(settings, "IMPORT_STALE_JOB_TIMEOUT", 600) / 10
+
+        # Workers are not daemonic so they can start their own process pools
+        # for parallel imports.
+        context = multiprocessing.get_context("fork")
+        stop_event = context.Event()
+        workers = [None] * concurrency
+        stopping = False
+
+        def stop(signum, frame):
+            nonlocal stopping
+            stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(f"Starting {concurrency} import worker(s)")
+        next_recovery = 0
+        while not stopping:
+            if time.monotonic() >= next_recovery:
+                recovered = recover_stale_jobs()
+                if recovered:
+                    self.stdout.write(f"Requeued {recovered} stale job(s)")
+                next_recovery = time.monotonic() + recovery_interval
+
+            # Forked children must not share the parent's database connection.
+            connections.close_all()
+            for slot, worker in enumerate(workers):
+                if worker is None or not worker.is_alive():
+                    workers[slot] = context.Process(
+                        target=_run_worker, args=(stop_event, poll_interval)
+                    )
+                    workers[slot].start()
+
+            time.sleep(1)
+
+        self.stdout.write("Stopping import workers")
+        stop_event.set()
+        for worker in workers:
+            if worker is not None:
+                worker.join()
@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import ImportCounter, ImportJob
+
+RESULT_FIELDS = {
+    "success": "success_count",
+    "unchanged": "unchanged_count",
+    "warning": "warning_count",
+    "error": "error_count",
+}
+COUNT_FIELDS = ["total_rows", *RESULT_FIELDS.values()]
+# ImportCounter metric per StageProfiler statistic.
+STAGE_COUNTERS = {
+    "stage_wall": "wall",
+    "stage_cpu": "cpu",
+    "stage_queries": "queries",
+    "stage_query_time": "query_time",
+}
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def _metric(lines, name, metric_type, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    for labels, value in samples:
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+
+
+def _number(value):
+    return int(value) if value.is_integer() else round(value, 6)
+
+
+def record_run(counts, profile, using):
+    # Adds a finished run to the counters. ``counts`` are the run's own row
+    # counts (COUNT_FIELDS) and ``profile`` its StageProfiler.as_dict().
+    increments = {("rows", ""): counts["total_rows"], ("chunks", ""): profile["chunks"]}
+    for result, field in RESULT_FIELDS.items():
+        increments["row_results", result] = counts[field]
+    for stage, stats in profile["stages"].items():
+        for metric, key in STAGE_COUNTERS.items():
+            increments[metric, stage] = stats[key]
+    increments = {key: value for key, value in increments.items() if value}
+
+    counters = ImportCounter.objects.using(using)
+    with transaction.atomic(using=using):
+        counters.bulk_create(
+            [ImportCounter(metric=metric, label=label) for metric, label in increments],
+            ignore_conflicts=True,
+        )
+        for (metric, label), value in increments.items():
+            counters.filter(metric=metric, label=label).update(value=F("value") + value)
+
+
+def render_metrics():
+    # Prometheus text exposition format (version 0.0.4). Row, chunk and
+    # stage counters come from ImportCounter (see record_run).
+    lines = []
+
+    jobs_by_status = dict(
+        ImportJob.objects.values_list("status").annotate(count=Count("id"))
+    )
+    _metric(
+        lines,
+        "import_jobs",
+        "gauge",
+        "Import jobs by status.",
+        [
+            (_labels(status=status), jobs_by_status.get(status, 0))
+            for status in ("pending", "processing", "completed", "failed")
+        ],
+    )
+
+    counters = {
+        (metric, label): _number(value)
+        for metric, label, value in ImportCounter.objects.values_list(
+            "metric", "label", "value"
+        )
+    }
+    _metric(
+        lines,
+        "import_rows_total",
+        "counter",
+        "Rows read by import jobs.",
+        [("", counters.get(("rows", ""), 0))],
+    )
+    _metric(
+        lines,
+        "import_row_results_total",
+        "counter",
+        "Imported rows by result.",
+        [
+            (_labels(result=result), counters.get(("row_results", result), 0))
+            for result in RESULT_FIELDS
+        ],
+    )
+
+    stages = sorted(
+        {label for metric, label in counters if metric.startswith("stage_")}
+    )
+    _metric(
+        lines,
+        "import_chunks_total",
+        "counter",
+        "Chunks processed by finished import jobs.",
+        [("", counters.get(("chunks", ""), 0))],
+    )
+    _metric(
+        lines,
+        "import_stage_seconds_total",
+        "counter",
+        "Time spent in each import stage.",
+        [
+            (
+                _labels(stage=stage, clock=clock),
+                counters.get((f"stage_{clock}", stage), 0),
+            )
+            for stage in stages
+            for clock in ("wall", "cpu")
+        ],
+    )
+    _metric(
+        lines,
+        "import_stage_queries_total",
+        "counter",
+        "Database queries run in each import stage.",
+        [
+            (_labels(stage=stage), counters.get(("stage_queries", stage), 0))
+            for stage in stages
+        ],
+    )
+    _metric(
+        lines,
+        "import_stage_query_seconds_total",
+        "counter",
+        "Time spent in database queries in each import stage.",
+        [
+            (_labels(stage=stage), counters.get(("stage_query_time", stage), 0))
+            for stage in stages
+        ],
+    )
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0002_import_job_queue"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="expected_rows",
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
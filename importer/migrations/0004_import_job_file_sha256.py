@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0003_import_job_expected_rows"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="file_sha256",
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
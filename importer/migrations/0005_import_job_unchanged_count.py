@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0004_import_job_file_sha256"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="unchanged_count",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0005_import_job_unchanged_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="profile",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0006_import_job_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="engine",
+            field=models.CharField(
+                choices=[
+                    ("orm", "ORM bulk upsert"),
+                    ("copy", "PostgreSQL COPY staging table"),
+                ],
+                default="orm",
+                max_length=10,
+            ),
+        ),
+    ]
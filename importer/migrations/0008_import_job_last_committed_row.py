@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0007_import_job_engine"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="last_committed_row",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:34
+
+import django.db.models.deletion
+import utils.common
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0008_import_job_last_committed_row"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="importjob",
+            name="id",
+            field=models.UUIDField(
+                db_index=True,
+                default=utils.common.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="importlog",
+            name="id",
+            field=models.UUIDField(
+                db_index=True,
+                default=utils.common.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="importlog",
+            name="job",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="logs",
+                to="importer.importjob",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="importlog",
+            index=models.Index(
+                fields=["job", "created_at", "id"], name="importer_im_job_id_e0ec5e_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="importlog",
+            index=models.Index(
+                fields=["job", "log_type", "row_number"],
+                name="importer_im_job_id_737d10_idx",
+            ),
+        ),
+    ]
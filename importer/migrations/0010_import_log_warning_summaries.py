@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0009_uuid7_keys_and_import_log_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="warning_logs",
+            field=models.CharField(
+                choices=[
+                    ("summary", "One entry per warning with the rows it affects"),
+                    ("rows", "One entry per row"),
+                ],
+                default="summary",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="importlog",
+            name="details",
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
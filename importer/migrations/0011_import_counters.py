@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0010_import_log_warning_summaries"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("metric", models.CharField(max_length=30)),
+                ("label", models.CharField(blank=True, max_length=30)),
+                ("value", models.FloatField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("metric", "label"), name="unique_import_counter"
+                    )
+                ],
+            },
+        ),
+    ]
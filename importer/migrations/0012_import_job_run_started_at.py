@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("importer", "0011_import_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="rows_before_run",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="run_started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
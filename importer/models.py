@@ -1,19 +1,38 @@
 from django.db import models
 
 from utils.common import CommonModel
-from utils.enums import LOG_TYPES, STATUS_CHOICES
+from utils.enums import IMPORT_ENGINES, LOG_TYPES, STATUS_CHOICES, WARNING_LOG_MODES
 
 
 class ImportJob(CommonModel):
 
     file = models.FileField(upload_to="imports/")
+    file_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    engine = models.CharField(max_length=10, choices=IMPORT_ENGINES, default="orm")
+    warning_logs = models.CharField(
+        max_length=10, choices=WARNING_LOG_MODES, default="summary"
+    )
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Start of the latest run and the rows earlier runs had read, so a
+    # resumed job's throughput leaves out the time it was not running.
+    run_started_at = models.DateTimeField(null=True, blank=True)
+    rows_before_run = models.IntegerField(default=0)
     total_rows = models.IntegerField(default=0)
+    expected_rows = models.IntegerField(null=True, blank=True)
     success_count = models.IntegerField(default=0)
+    unchanged_count = models.IntegerField(default=0)
     warning_count = models.IntegerField(default=0)
     error_count = models.IntegerField(default=0)
+    last_committed_row = models.IntegerField(default=0)
+    worker_id = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    profile = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
 
     def __str__(self):
         return f"Import {self.id} - {self.status}"
@@ -21,13 +40,43 @@ class ImportJob(CommonModel):
 
 class ImportLog(CommonModel):
 
-    job = models.ForeignKey(ImportJob, on_delete=models.CASCADE, related_name="logs")
+    # Indexed by the composite indexes below, which all start with job.
+    job = models.ForeignKey(
+        ImportJob, on_delete=models.CASCADE, related_name="logs", db_index=False
+    )
     log_type = models.CharField(max_length=10, choices=LOG_TYPES)
     row_number = models.IntegerField(null=True, blank=True)
     message = models.TextField()
+    # Set on warning summaries: {"warning", "count", "rows": [[first, last]]}.
+    details = models.JSONField(null=True, blank=True)
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # Keyset pages of one job's logs (utils.pagination).
+            models.Index(fields=["job", "created_at", "id"]),
+            # log_type and row range filters.
+            models.Index(fields=["job", "log_type", "row_number"]),
+        ]
 
     def __str__(self):
         return f"{self.get_log_type_display()} at row {self.row_number}: {self.message[:50]}"
+
+
+class ImportCounter(models.Model):
+    # Running totals over every finished run of every import job, served by
+    # /api/metrics. They are added to when a run finishes, so they never go
+    # down when jobs are deleted and a scrape reads a handful of rows.
+    metric = models.CharField(max_length=30)
+    label = models.CharField(max_length=30, blank=True)
+    value = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["metric", "label"], name="unique_import_counter"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.metric}[{self.label}] = {self.value}"
@@ -0,0 +1,133 @@
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from utils.excel_processor import ExcelProductProcessor
+from .models import ImportJob, ImportLog
+
+
+def get_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(worker_id):
+    with transaction.atomic():
+        job = (
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(status="pending")
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+
+        # The conditional update keeps the claim safe on backends that
+        # ignore SELECT ... FOR UPDATE, such as SQLite.
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(pk=job.pk, status="pending").update(
+            status="processing",
+            worker_id=worker_id,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+        if not claimed:
+            return None
+
+    job.refresh_from_db()
+    return job
+
+
+def recover_stale_jobs():
+    cutoff = timezone.now() - timedelta(
+        seconds=getattr(settings, "IMPORT_STALE_JOB_TIMEOUT", 600)
+    )
+    max_attempts = getattr(settings, "IMPORT_MAX_JOB_ATTEMPTS", 3)
+    stale = ImportJob.objects.filter(status="processing").filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, updated_at__lt=cutoff)
+    )
+
+    recovered = 0
+    for job in stale:
+        status = "pending" if job.attempts < max_attempts else "failed"
+        # The failure is logged before the status changes, in the same
+        # transaction, so no response for the failed job lacks it.
+        with transaction.atomic():
+            if status == "failed":
+                ImportLog.objects.create(
+                    job=job,
+                    log_type="error",
+                    message=f"Processing failed: worker {job.worker_id} stopped "
+                    f"responding after {job.attempts} attempts",
+                )
+            updated = ImportJob.objects.filter(pk=job.pk, status="processing").update(
+                status=status, worker_id="", updated_at=timezone.now()
+            )
+            if not updated:
+                # Another supervisor or the worker got there first.
+                transaction.set_rollback(True)
+                continue
+
+        recovered += 1
+
+    return recovered
+
+
+def resume_job(job):
+    # Puts a failed job, or one whose worker stopped sending heartbeats,
+    # back in the queue. The worker that claims it continues after
+    # last_committed_row. Returns False if the job cannot be resumed.
+    cutoff = timezone.now() - timedelta(
+        seconds=getattr(settings, "IMPORT_STALE_JOB_TIMEOUT", 600)
+    )
+    resumable = Q(status="failed") | Q(status="processing", heartbeat_at__lt=cutoff)
+    resumed = (
+        ImportJob.objects.filter(resumable, pk=job.pk).update(
+            status="pending", worker_id="", attempts=0, updated_at=timezone.now()
+        )
+        > 0
+    )
+    if resumed:
+        job.refresh_from_db()
+    return resumed
+
+
+def run_job(job_id):
+    try:
+        processor = ExcelProductProcessor(
+            job_id, using=getattr(settings, "IMPORT_DATABASE_ALIAS", "default")
+        )
+        processor.process()
+
+    except Exception as e:
+        # Logged first, as in recover_stale_jobs.
+        with transaction.atomic():
+            ImportLog.objects.create(
+                job_id=job_id,
+                log_type="error",
+                message=f"Processing failed: {str(e)}",
+            )
+            ImportJob.objects.filter(pk=job_id).update(
+                status="failed", updated_at=timezone.now()
+            )
+
+
+def work(stop_event, poll_interval=2.0):
+    worker_id = get_worker_id()
+    while not stop_event.is_set():
+        try:
+            job = claim_next_job(worker_id)
+        except DatabaseError:
+            # Another worker holds the write lock (SQLite); try again later.
+            job = None
+
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        run_job(job.id)
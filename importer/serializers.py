@@ -1,3 +1,5 @@
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from .models import ImportJob, ImportLog
 
@@ -5,33 +7,97 @@ from .models import ImportJob, ImportLog
 class ImportLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = ImportLog
-        fields = ["log_type", "row_number", "message", "created_at"]
+        fields = ["log_type", "row_number", "message", "details", "created_at"]
 
 
-class ImportJobSerializer(serializers.ModelSerializer):
-    logs = ImportLogSerializer(many=True, read_only=True)
+class ImportJobSummarySerializer(serializers.ModelSerializer):
+    # Job fields and progress only. Logs are served page by page from
+    # /api/import/<uuid>/logs so polling a job does not load all of them.
+    rows_per_second = serializers.SerializerMethodField()
+    eta_seconds = serializers.SerializerMethodField()
 
     class Meta:
         model = ImportJob
         fields = [
             "id",
             "file",
+            "file_sha256",
             "status",
+            "engine",
+            "warning_logs",
             "started_at",
             "completed_at",
             "total_rows",
+            "expected_rows",
             "success_count",
+            "unchanged_count",
             "warning_count",
             "error_count",
-            "logs",
+            "last_committed_row",
+            "rows_per_second",
+            "eta_seconds",
+            "profile",
         ]
         read_only_fields = [
+            "file_sha256",
             "status",
+            "engine",
+            "warning_logs",
             "started_at",
             "completed_at",
             "total_rows",
+            "expected_rows",
             "success_count",
+            "unchanged_count",
             "warning_count",
             "error_count",
-            "logs",
+            "last_committed_row",
+            "profile",
         ]
+
+    @extend_schema_field(serializers.FloatField(allow_null=True))
+    def get_rows_per_second(self, obj):
+        # Over the latest run only: a resumed job's earlier rows and the
+        # time before it was resumed are left out.
+        rows = obj.total_rows - obj.rows_before_run
+        if obj.status == "pending" or rows <= 0:
+            return None
+
+        started_at = obj.run_started_at or obj.started_at
+        elapsed = (obj.completed_at or timezone.now()) - started_at
+        if elapsed.total_seconds() <= 0:
+            return None
+        return round(rows / elapsed.total_seconds(), 1)
+
+    @extend_schema_field(serializers.IntegerField(allow_null=True))
+    def get_eta_seconds(self, obj):
+        if obj.status != "processing" or obj.expected_rows is None:
+            return None
+
+        rows_per_second = self.get_rows_per_second(obj)
+        if not rows_per_second:
+            return None
+        remaining_rows = max(obj.expected_rows - obj.total_rows, 0)
+        return round(remaining_rows / rows_per_second)
+
+
+class ImportJobProgressSerializer(ImportJobSummarySerializer):
+    # What /api/import/<uuid>/events streams on every change.
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "status",
+            "started_at",
+            "completed_at",
+            "total_rows",
+            "expected_rows",
+            "success_count",
+            "unchanged_count",
+            "warning_count",
+            "error_count",
+            "last_committed_row",
+            "rows_per_second",
+            "eta_seconds",
+        ]
+        read_only_fields = fields
@@ -1,3 +1,1274 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.test import APIClient
+
+from importer.checks import check_upload_storage
+from importer.metrics import render_metrics
+from importer.models import ImportJob, ImportLog
+from importer.queue import claim_next_job, recover_stale_jobs, run_job
+from importer.serializers import ImportJobSummarySerializer
+from importer.views import completed_job_responses
+from products.models import Product
+from utils.cache import TTLCache
+from utils.chunking import AdaptiveChunkSizer
+from utils.common import uuid7
+from utils.copy_engine import _constraint_checks, constraint_error
+from utils.excel_processor import PRODUCT_FIELDS, ExcelProductProcessor
+from utils.headers import FEED_COLUMNS, HeaderError, HeaderMap
+from utils.import_log import ImportLogBuffer
+from utils.memory import MemoryMonitor
+from utils.readers import OpenpyxlReader, XlsxStreamReader, get_reader
+from utils.row_ranges import RowRanges
+from utils.validators import ProductValidator
+
+
+def make_row(**values):
+    row = {
+        "id": "SKU-1",
+        "title": "Shirt",
+        "image_link": "https://example.com/shirt.png",
+        "description": "A shirt",
+        "link": "https://example.com/shirt",
+        "price": "1,299.00 USD",
+        "sale_price": "999.00 USD",
+        "item_group_id": "G-1",
+        "availability": "in stock",
+        "brand": "Acme",
+        "gtin": "0001",
+        "gender": "unisex",
+        "google_product_category": "Apparel",
+        "product_type": "Shirts",
+        "material": "cotton",
+        "pattern": "plain",
+        "color": "blue",
+        "size": "M",
+        "model": "S1",
+        "condition": "new",
+    }
+    row.update(values)
+    return tuple(row.get(column) for column in FEED_COLUMNS)
+
+
+class FeedJobMixin:
+    rows = []
+
+    def make_job(self, rows=None, **fields):
+        feed = io.StringIO()
+        csv.writer(feed).writerows(
+            [FEED_COLUMNS, *(self.rows if rows is None else rows)]
+        )
+        job = ImportJob.objects.create(
+            file=ContentFile(feed.getvalue().encode(), name="feed.csv"), **fields
+        )
+        self.addCleanup(job.file.delete, save=False)
+        return job
+
+    def run_job(self, rows=None, workers=None, **fields):
+        job = self.make_job(rows, **fields)
+        ExcelProductProcessor(job.id, workers=workers).process()
+        job.refresh_from_db()
+        return job
+
+
+class ColumnarValidationParityTests(SimpleTestCase):
+    rows = [
+        make_row(),
+        make_row(title=None, brand=""),
+        make_row(gtin=0, gender=None, size=""),
+        make_row(price=25, sale_price=30),
+        make_row(price=12.5, sale_price=None),
+        make_row(price="0 USD", sale_price="-1 USD"),
+        make_row(price="abc"),
+        make_row(sale_price="n/a"),
+        make_row(price="", sale_price=""),
+        make_row(price=None),
+        make_row(price="10 USD", sale_price="10 USD"),
+        make_row(price="nan", sale_price="5"),
+        make_row(price="1_000", sale_price="2"),
+        make_row(price="   ", sale_price="   "),
+        make_row(id="0", title=0.0, description=False),
+        make_row(title=float("nan"), color=float("nan"), price=float("nan")),
+        make_row(price=12.5, sale_price=float("nan")),
+        (None,) * len(FEED_COLUMNS),
+    ]
+
+    def validate_rows(self, rows):
+        results = []
+        for row_num, row in enumerate(rows, start=2):
+            errors = ProductValidator.validate_required_fields(row, row_num)
+            warnings = ProductValidator.validate_warning_fields(row, row_num)
+            warnings.extend(ProductValidator.validate_price(row, row_num))
+            results.append((errors, warnings))
+        return results
+
+    def validate_frame(self, rows):
+        frame = pd.DataFrame(rows, columns=FEED_COLUMNS, dtype=object)
+        return ProductValidator.validate_frame(frame)
+
+    def test_messages_match_row_validators(self):
+        expected = self.validate_rows(self.rows)
+        actual = self.validate_frame(self.rows)
+
+        self.assertEqual(len(actual), len(expected))
+        for row_num, (row_result, frame_result) in enumerate(
+            zip(expected, actual), start=2
+        ):
+            with self.subTest(row_num=row_num):
+                self.assertEqual(frame_result, row_result)
+
+    def test_complete_row_has_no_messages(self):
+        self.assertEqual(self.validate_frame([make_row()]), [([], [])])
+
+    def test_blank_sale_price_only_warns(self):
+        errors, warnings = self.validate_rows([make_row(sale_price=None)])[0]
+        self.assertEqual(errors, [])
+        self.assertEqual(warnings, ["Missing recommended field: sale_price"])
+
+    def test_numeric_prices_are_parsed(self):
+        errors, warnings = self.validate_rows([make_row(price=25, sale_price=30)])[0]
+        self.assertEqual(warnings, ["Sale price should be less than regular price"])
+
+
+class HeaderMapTests(SimpleTestCase):
+    def test_reordered_columns_are_mapped_by_name(self):
+        header = list(reversed(FEED_COLUMNS))
+        row = tuple(reversed(make_row()))
+
+        self.assertEqual(HeaderMap(header)(row), make_row())
+
+    def test_aliases_and_case_are_normalized(self):
+        header_map = HeaderMap(
+            ["SKU", "Title", "Image Link", "DESCRIPTION", "link", "Price"]
+            + ["Availability", "Brand", "GTIN", "condition", "Model"]
+        )
+        row = header_map(
+            ("S-1", "Shirt", "img", "desc", "url", "1")
+            + ("in stock", "Acme", "0001", "new", "S1")
+        )
+
+        self.assertEqual(row[FEED_COLUMNS.index("id")], "S-1")
+        self.assertEqual(row[FEED_COLUMNS.index("image_link")], "img")
+        self.assertEqual(row[FEED_COLUMNS.index("model")], "S1")
+        self.assertIsNone(row[FEED_COLUMNS.index("sale_price")])
+        self.assertIn("sale_price", header_map.missing_columns)
+
+    def test_short_rows_are_padded(self):
+        row = HeaderMap(FEED_COLUMNS)(("S-1", "Shirt"))
+
+        self.assertEqual(len(row), len(FEED_COLUMNS))
+        self.assertEqual(row[:2], ("S-1", "Shirt"))
+        self.assertEqual(set(row[2:]), {None})
+
+    def test_missing_required_column_fails(self):
+        header = [column for column in FEED_COLUMNS if column != "price"]
+
+        with self.assertRaisesMessage(HeaderError, "missing required columns: price"):
+            HeaderMap(header)
+
+    def test_unknown_column_fails(self):
+        with self.assertRaisesMessage(HeaderError, "unknown columns: colour"):
+            HeaderMap(FEED_COLUMNS + ["colour"])
+
+
+class XlsxReaderParityTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(FEED_COLUMNS)
+        sheet.append(make_row())
+        sheet.append(make_row(gtin=12345, price=19.5, sale_price=None, title="Ünïcode"))
+        sheet.append(make_row(brand=True, color="x005F_x0041", size=""))
+        # Leave a gap so both readers have to yield the empty row.
+        sheet.append(make_row(id="SKU-2", gtin=-1.25e-7)[:5])
+        sheet.cell(row=7, column=3, value="sparse")
+        workbook.save(self.path)
+
+    def read(self, reader_class):
+        with reader_class(self.path) as reader:
+            return reader.expected_rows, list(reader.iter_rows())
+
+    def test_stream_reader_matches_openpyxl(self):
+        self.assertEqual(self.read(XlsxStreamReader), self.read(OpenpyxlReader))
+
+
+class TextReaderTests(SimpleTestCase):
+    rows = [
+        FEED_COLUMNS,
+        make_row(description='Says "hi",\nthen leaves'),
+        make_row(brand="", gtin=None),
+    ]
+
+    def write(self, suffix, opener=open, delimiter=","):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with opener(path, "wt", newline="", encoding="utf-8") as feed:
+            csv.writer(feed, delimiter=delimiter).writerows(self.rows)
+        return path
+
+    def read(self, path):
+        with get_reader(path) as reader:
+            return list(reader.iter_rows())
+
+    def test_csv_tsv_and_gzip_read_the_same_rows(self):
+        expected = [tuple(value or None for value in row) for row in self.rows]
+        self.assertEqual(self.read(self.write(".csv")), expected)
+        self.assertEqual(self.read(self.write(".tsv", delimiter="\t")), expected)
+        self.assertEqual(self.read(self.write(".csv.gz", opener=gzip.open)), expected)
+
+
+class AdaptiveChunkSizerTests(SimpleTestCase):
+    def make_sizer(self):
+        return AdaptiveChunkSizer(
+            initial=100, minimum=10, maximum=1000, target_seconds=0.5
+        )
+
+    def test_fast_writes_grow_the_chunk_up_to_the_maximum(self):
+        sizer = self.make_sizer()
+        sizer.observe(2, 100, 0.01)
+        self.assertEqual(sizer.size, 200)
+        for _ in range(10):
+            sizer.observe(2, sizer.size, 0.01)
+        self.assertEqual(sizer.size, 1000)
+
+    def test_slow_writes_move_towards_the_target(self):
+        sizer = self.make_sizer()
+        sizer.observe(2, 100, 0.8)
+        self.assertEqual(sizer.size, 62)
+
+    def test_retries_halve_the_chunk_without_counting_it(self):
+        sizer = self.make_sizer()
+        sizer.retry(2, 100)
+        self.assertEqual(sizer.size, 50)
+        sizer.observe(2, 50, 0.5)
+        summary = sizer.as_dict()
+        self.assertEqual(summary["history"], [[102, 50]])
+        self.assertEqual(
+            (summary["chunks"], summary["retries"], summary["mean"]), (1, 1, 50.0)
+        )
+
+        merged = self.make_sizer()
+        merged.merge(summary)
+        self.assertEqual((merged.chunks, merged.retries), (1, 1))
+
+
+class MemoryMonitorTests(SimpleTestCase):
+    def test_tracing_is_opt_in(self):
+        monitor = MemoryMonitor(budget_bytes=1024**3)
+        monitor.start()
+        self.assertFalse(tracemalloc.is_tracing())
+        message, over_budget = monitor.stop()
+        self.assertNotIn("traced", message)
+        self.assertFalse(over_budget)
+
+    def test_worker_peak_is_the_one_reported(self):
+        # Worker processes of earlier jobs must not show up in this one.
+        monitor = MemoryMonitor()
+        monitor.start()
+        self.assertNotIn("worker", monitor.stop()[0])
+        monitor.start()
+        message = monitor.stop(worker_peak_rss=3 * 1024 * 1024)[0]
+        self.assertIn("largest worker process 3.0 MB", message)
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "SQLite pragmas")
+class SqlitePragmaTests(SimpleTestCase):
+    def test_new_connections_get_the_pragmas(self):
+        handle, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        # A file database: in-memory ones cannot use WAL.
+        database = connections["default"]
+        connection = type(database)(
+            {**database.settings_dict, "NAME": path}, alias="pragma_test"
+        )
+        self.addCleanup(connection.close)
+
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ("journal_mode", "busy_timeout", "synchronous"):
+                cursor.execute(f"PRAGMA {name}")
+                pragmas[name] = cursor.fetchone()[0]
+        # synchronous = NORMAL reads back as 1.
+        self.assertEqual(
+            pragmas, {"journal_mode": "wal", "busy_timeout": 5000, "synchronous": 1}
+        )
+
+
+class CopyEngineConstraintTests(SimpleTestCase):
+    checks = _constraint_checks(PRODUCT_FIELDS)
+
+    def product_data(self, **values):
+        data = {field: "x" for field in PRODUCT_FIELDS}
+        data.update(price=10.0, sale_price=None)
+        data.update(values)
+        return data
+
+    def test_valid_row_passes(self):
+        self.assertIsNone(constraint_error(self.product_data(), self.checks))
+
+    def test_rows_the_database_would_reject_are_reported(self):
+        self.assertEqual(
+            constraint_error(self.product_data(price=None), self.checks),
+            'null value in column "price" of relation "products_product" '
+            "violates not-null constraint",
+        )
+        self.assertEqual(
+            constraint_error(self.product_data(gender="x" * 21), self.checks),
+            "value too long for type character varying(20)",
+        )
+        self.assertEqual(
+            constraint_error(self.product_data(price=123456789.0), self.checks),
+            "numeric field overflow",
+        )
+
+    def test_decimals_are_checked_after_rounding_to_the_scale(self):
+        self.assertEqual(
+            constraint_error(self.product_data(price=99999999.995), self.checks),
+            "numeric field overflow",
+        )
+        self.assertEqual(
+            constraint_error(self.product_data(price=-99999999.995), self.checks),
+            "numeric field overflow",
+        )
+        self.assertIsNone(
+            constraint_error(self.product_data(price=99999999.994), self.checks)
+        )
+
+
+@override_settings(IMPORT_CHUNK_SIZE=10, IMPORT_ADAPTIVE_CHUNK_SIZE=False)
+class WritePathTests(FeedJobMixin, TransactionTestCase):
+    # An unparseable price passes validation with a warning but becomes
+    # NULL, which the database rejects.
+    rows = [
+        make_row(id="SKU-1"),
+        make_row(id="SKU-2", price="abc"),
+        make_row(id="SKU-3"),
+        make_row(id="SKU-4", title="First"),
+        make_row(id="SKU-4", title="Second", price="abc"),
+    ]
+
+    def test_rejected_rows_are_isolated_within_the_chunk(self):
+        job = self.run_job()
+
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(
+            (job.total_rows, job.success_count, job.error_count), (5, 3, 2)
+        )
+        self.assertEqual(
+            dict(Product.objects.values_list("sku", "title")),
+            {"SKU-1": "Shirt", "SKU-3": "Shirt", "SKU-4": "First"},
+        )
+        errors = list(
+            ImportLog.objects.filter(job=job, log_type="error")
+            .order_by("row_number")
+            .values_list("row_number", "message")
+        )
+        self.assertEqual([row_num for row_num, message in errors], [3, 6])
+        for row_num, message in errors:
+            self.assertIn("price", message)
+
+    def test_failed_write_is_bisected(self):
+        rows = [make_row(id=f"SKU-{number}") for number in range(1, 9)]
+        rows[5] = make_row(id="SKU-6", price="abc")
+        job = self.make_job(rows)
+        processor = ExcelProductProcessor(job.id)
+
+        with mock.patch.object(
+            processor, "_bulk_upsert", wraps=processor._bulk_upsert
+        ) as bulk_upsert:
+            processor.process()
+
+        # Only the halves holding the bad row are split further.
+        self.assertEqual(
+            [len(call.args[0]) for call in bulk_upsert.call_args_list],
+            [8, 4, 4, 2, 1, 1, 2],
+        )
+        self.assertEqual(Product.objects.count(), 7)
+
+    def test_rejected_rows_do_not_shrink_chunks(self):
+        job = self.run_job()
+        self.assertEqual(job.profile["chunk_sizes"]["retries"], 0)
+        self.assertEqual(job.profile["chunk_sizes"]["history"], [])
+
+    def test_locked_chunk_is_retried(self):
+        record_progress = ExcelProductProcessor._record_progress
+        calls = []
+
+        def locked_once(processor, *args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return record_progress(processor, *args, **kwargs)
+
+        with mock.patch.object(ExcelProductProcessor, "_record_progress", locked_once):
+            job = self.run_job()
+
+        # The retry is not counted as another chunk.
+        chunk_sizes = job.profile["chunk_sizes"]
+        self.assertEqual((chunk_sizes["chunks"], chunk_sizes["retries"]), (1, 1))
+        self.assertEqual(chunk_sizes["chunks"], job.profile["chunks"])
+        self.assertEqual(chunk_sizes["mean"], 5.0)
+        self.assertEqual(
+            (job.status, job.total_rows, job.success_count, job.error_count),
+            ("completed", 5, 3, 2),
+        )
+        self.assertEqual(
+            sorted(
+                ImportLog.objects.filter(job=job)
+                .exclude(log_type="info")
+                .values_list("row_number", flat=True)
+            ),
+            [3, 6],
+        )
+
+
+class ImportLogBufferTests(FeedJobMixin, TransactionTestCase):
+    def setUp(self):
+        self.job = ImportJob.objects.create(file="imports/feed.csv")
+
+    def logged(self):
+        return list(
+            ImportLog.objects.filter(job=self.job)
+            .order_by("row_number")
+            .values_list("row_number", flat=True)
+        )
+
+    def test_flushes_when_full(self):
+        buffer = ImportLogBuffer(self.job, buffer_size=3)
+        buffer.add("warning", "Missing color", row_number=2)
+        buffer.add("warning", "Missing color", row_number=3)
+        self.assertEqual(self.logged(), [])
+
+        buffer.add("warning", "Missing color", row_number=4)
+        self.assertEqual(self.logged(), [2, 3, 4])
+        buffer.flush()
+        self.assertEqual(self.logged(), [2, 3, 4])
+
+    def test_restore_brings_back_entries_of_a_rolled_back_flush(self):
+        buffer = ImportLogBuffer(self.job)
+        buffer.add("error", "Missing title", row_number=2)
+        pending = buffer.snapshot()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                buffer.flush()
+                raise RuntimeError("chunk failed")
+        self.assertEqual(self.logged(), [])
+
+        buffer.restore(pending)
+        buffer.flush()
+        self.assertEqual(self.logged(), [2])
+
+    @override_settings(
+        IMPORT_CHUNK_SIZE=2, IMPORT_MIN_CHUNK_SIZE=1, IMPORT_ADAPTIVE_CHUNK_SIZE=False
+    )
+    def test_job_failing_mid_chunk_logs_each_row_once(self):
+        job = self.make_job(
+            [
+                make_row(id="SKU-1"),
+                make_row(id="SKU-2", title=""),
+                make_row(id="SKU-3", title=""),
+                make_row(id="SKU-4", color=""),
+                make_row(id="SKU-5"),
+                make_row(id="SKU-6", title=""),
+            ],
+            warning_logs="rows",
+        )
+        log_warning = ExcelProductProcessor._log_warning
+
+        def crash_at_row_5(processor, row_num, message):
+            # Row 4's error is already buffered when row 5 fails.
+            if row_num == 5:
+                raise RuntimeError("worker died")
+            return log_warning(processor, row_num, message)
+
+        with mock.patch.object(ExcelProductProcessor, "_log_warning", crash_at_row_5):
+            with self.assertRaises(RuntimeError):
+                ExcelProductProcessor(job.id).process()
+
+        # The rolled-back chunk's entries are not flushed with the rest.
+        problems = ImportLog.objects.filter(job=job).exclude(log_type="info")
+        self.assertEqual(list(problems.values_list("row_number", flat=True)), [3])
+
+        self.client.post(f"/api/import/{job.id}/resume")
+        ExcelProductProcessor(job.id).process()
+        self.assertEqual(
+            sorted(problems.values_list("row_number", "log_type")),
+            [(3, "error"), (4, "error"), (5, "warning"), (7, "error")],
+        )
+
+
+class InlineExecutor:
+    # Stands in for ProcessPoolExecutor so partitions run in this process
+    # and share the test database.
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class FingerprintSkipTests(FeedJobMixin, TransactionTestCase):
+    rows = [make_row(id=f"SKU-{number}") for number in range(1, 4)]
+
+    def test_unchanged_rows_are_not_rewritten(self):
+        self.run_job()
+        updated_at = dict(Product.objects.values_list("sku", "updated_at"))
+
+        with mock.patch.object(
+            ExcelProductProcessor,
+            "_bulk_upsert",
+            autospec=True,
+            side_effect=ExcelProductProcessor._bulk_upsert,
+        ) as bulk_upsert:
+            job = self.run_job()
+        self.assertEqual((job.success_count, job.unchanged_count), (0, 3))
+        self.assertFalse(any(call.args[1] for call in bulk_upsert.call_args_list))
+        self.assertEqual(
+            dict(Product.objects.values_list("sku", "updated_at")), updated_at
+        )
+
+        rows = [*self.rows[:2], make_row(id="SKU-3", title="Blouse")]
+        with mock.patch.object(
+            ExcelProductProcessor,
+            "_bulk_upsert",
+            autospec=True,
+            side_effect=ExcelProductProcessor._bulk_upsert,
+        ) as bulk_upsert:
+            job = self.run_job(rows)
+        self.assertEqual((job.success_count, job.unchanged_count), (1, 2))
+        written = [
+            product.sku
+            for call in bulk_upsert.call_args_list
+            for product in call.args[1]
+        ]
+        self.assertEqual(written, ["SKU-3"])
+        self.assertEqual(Product.objects.get(sku="SKU-3").title, "Blouse")
+        changed = {
+            sku
+            for sku, value in Product.objects.values_list("sku", "updated_at")
+            if value != updated_at[sku]
+        }
+        self.assertEqual(changed, {"SKU-3"})
+
+
+@override_settings(
+    IMPORT_PARTITION_SIZE=2, IMPORT_CHUNK_SIZE=10, IMPORT_ADAPTIVE_CHUNK_SIZE=False
+)
+class ParallelDuplicateSkuTests(TransactionTestCase):
+    def make_job(self, rows):
+        workbook = Workbook()
+        workbook.active.append(FEED_COLUMNS)
+        for row in rows:
+            workbook.active.append(row)
+        feed = io.BytesIO()
+        workbook.save(feed)
+        job = ImportJob.objects.create(
+            file=ContentFile(feed.getvalue(), name="feed.xlsx")
+        )
+        self.addCleanup(job.file.delete, save=False)
+        return job
+
+    def test_repeated_skus_across_partitions(self):
+        # Partitions are rows 2-3, 4-5 and 6.
+        job = self.make_job(
+            [
+                make_row(id=123, title="Number"),
+                make_row(id="SKU-1", title="First"),
+                make_row(id="SKU-2"),
+                make_row(id="123", title="Text"),
+                make_row(id="SKU-1", title="Second", price="abc"),
+            ]
+        )
+        written = []
+        bulk_upsert = ExcelProductProcessor._bulk_upsert
+
+        def record_upsert(processor, products, existing):
+            written.extend((product.sku, product.title) for product in products)
+            return bulk_upsert(processor, products, existing)
+
+        with mock.patch(
+            "utils.excel_processor.ProcessPoolExecutor", InlineExecutor
+        ), mock.patch.object(ExcelProductProcessor, "_bulk_upsert", record_upsert):
+            ExcelProductProcessor(job.id, workers=2).process()
+        job.refresh_from_db()
+
+        # The numeric and text cells are one SKU, written once.
+        self.assertNotIn(("123", "Number"), written)
+        # SKU-1's last row fails, so its earlier row is written instead.
+        self.assertEqual(
+            dict(Product.objects.values_list("sku", "title")),
+            {"123": "Text", "SKU-1": "First", "SKU-2": "Shirt"},
+        )
+        self.assertEqual(
+            (job.total_rows, job.success_count, job.error_count), (5, 4, 1)
+        )
+        self.assertEqual(job.last_committed_row, 0)
+        self.assertEqual(
+            list(
+                ImportLog.objects.filter(job=job, log_type="error").values_list(
+                    "row_number", flat=True
+                )
+            ),
+            [6],
+        )
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "COPY engine needs PostgreSQL")
+class CopyEngineTests(FeedJobMixin, TransactionTestCase):
+    def run_job(self, rows):
+        return super().run_job(rows, engine="copy")
+
+    def test_copy_engine_matches_orm_semantics(self):
+        rows = [
+            make_row(id="SKU-1"),
+            make_row(id="SKU-2", title=""),
+            make_row(id="SKU-3", price="abc"),
+            make_row(id="SKU-1", title="Shirt v2"),
+        ]
+        job = self.run_job(rows)
+
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(
+            (job.total_rows, job.success_count, job.error_count), (4, 2, 2)
+        )
+        self.assertEqual(Product.objects.get(sku="SKU-1").title, "Shirt v2")
+        self.assertFalse(Product.objects.filter(sku__in=["SKU-2", "SKU-3"]).exists())
+        self.assertEqual(
+            sorted(
+                ImportLog.objects.filter(job=job, log_type="error").values_list(
+                    "row_number", flat=True
+                )
+            ),
+            [3, 4],
+        )
+
+        job = self.run_job(rows)
+        self.assertEqual((job.success_count, job.unchanged_count), (1, 1))
+
+    def test_rounding_overflow_is_a_row_error(self):
+        job = self.run_job(
+            [make_row(id="SKU-1"), make_row(id="SKU-2", price="99999999.995")]
+        )
+        self.assertEqual(
+            (job.status, job.success_count, job.error_count), ("completed", 1, 1)
+        )
+        self.assertEqual(
+            ImportLog.objects.get(job=job, log_type="error").message,
+            "numeric field overflow",
+        )
+
+    def test_rows_are_counted_once_the_merge_commits(self):
+        with mock.patch(
+            "utils.excel_processor.CopyStagingWriter.merge",
+            side_effect=OperationalError("canceling statement due to lock timeout"),
+        ):
+            with self.assertRaises(OperationalError):
+                self.run_job([make_row(id="SKU-1"), make_row(id="SKU-2")])
+        job = ImportJob.objects.get()
+        self.assertEqual(
+            (job.status, job.total_rows, job.success_count), ("failed", 2, 0)
+        )
+
+
+@override_settings(
+    IMPORT_CHUNK_SIZE=2, IMPORT_MIN_CHUNK_SIZE=1, IMPORT_ADAPTIVE_CHUNK_SIZE=False
+)
+class ResumeTests(FeedJobMixin, TransactionTestCase):
+    rows = [
+        make_row(id="SKU-1"),
+        make_row(id="SKU-2", title=""),
+        make_row(id="SKU-3"),
+        make_row(id="SKU-4", color=""),
+        make_row(id="SKU-5"),
+        make_row(id="SKU-6", title=""),
+    ]
+
+    def test_resumed_job_continues_after_the_last_committed_row(self):
+        job = self.make_job()
+        process_chunk = ExcelProductProcessor._process_chunk
+
+        def crash_on_third_chunk(processor, chunk, last_row_num, *args):
+            if last_row_num == 7:
+                raise RuntimeError("worker died")
+            return process_chunk(processor, chunk, last_row_num, *args)
+
+        with mock.patch.object(
+            ExcelProductProcessor, "_process_chunk", crash_on_third_chunk
+        ):
+            with self.assertRaises(RuntimeError):
+                ExcelProductProcessor(job.id).process()
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.last_committed_row), ("failed", 5))
+        first_run = job.profile
+
+        response = self.client.post(f"/api/import/{job.id}/resume")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+
+        ExcelProductProcessor(job.id).process()
+        job.refresh_from_db()
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(
+            (job.total_rows, job.success_count, job.warning_count, job.error_count),
+            (6, 4, 1, 2),
+        )
+        self.assertEqual(job.rows_before_run, 4)
+        self.assertGreater(job.run_started_at, job.started_at)
+        # The profile covers both runs and each row is counted once.
+        self.assertEqual(job.profile["chunks"], first_run["chunks"] + 1)
+        self.assertEqual(
+            job.profile["chunk_sizes"]["chunks"],
+            first_run["chunk_sizes"]["chunks"] + 1,
+        )
+        self.assertIn("import_rows_total 6\n", render_metrics())
+        self.assertEqual(
+            list(
+                ImportLog.objects.filter(job=job)
+                .exclude(log_type="info")
+                .order_by("row_number")
+                .values_list("row_number", flat=True)
+            ),
+            [3, 5, 7],
+        )
+        self.assertTrue(
+            ImportLog.objects.filter(
+                job=job, log_type="info", message="Resuming after row 5"
+            ).exists()
+        )
+
+    def test_job_started_over_drops_earlier_logs(self):
+        # A requeued job that never reached a checkpoint starts from row 2.
+        job = self.make_job(status="processing", error_count=1)
+        ImportLog.objects.create(
+            job=job, log_type="error", row_number=3, message="Earlier attempt"
+        )
+
+        ExcelProductProcessor(job.id).process()
+        job.refresh_from_db()
+        self.assertEqual(job.error_count, 2)
+        self.assertFalse(ImportLog.objects.filter(message="Earlier attempt").exists())
+        self.assertEqual(
+            list(
+                ImportLog.objects.filter(job=job, log_type="error")
+                .order_by("row_number")
+                .values_list("row_number", flat=True)
+            ),
+            [3, 7],
+        )
+
+    def test_completed_job_cannot_be_resumed(self):
+        job = self.make_job()
+        ExcelProductProcessor(job.id).process()
+
+        response = self.client.post(f"/api/import/{job.id}/resume")
+        self.assertEqual(response.status_code, 409)
+
+
+class ImportUploadTests(TestCase):
+    client_class = APIClient
+    feed = b"id,title,description\nSKU-1,Shirt,Cotton\n"
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.imports_dir = os.path.join(media_root.name, "imports")
+
+    def upload(self, *files, **data):
+        files = files or [SimpleUploadedFile("feed.csv", self.feed)]
+        return self.client.post(
+            "/api/import/", {"file": list(files), **data}, format="multipart"
+        )
+
+    def stored_files(self):
+        if not os.path.isdir(self.imports_dir):
+            return []
+        return sorted(os.listdir(self.imports_dir))
+
+    def test_upload_is_stored_with_its_sha256(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 201)
+        job = ImportJob.objects.get()
+        self.assertEqual(job.file_sha256, hashlib.sha256(self.feed).hexdigest())
+        with job.file.open("rb") as stored:
+            self.assertEqual(stored.read(), self.feed)
+        self.assertEqual(self.stored_files(), ["feed.csv"])
+
+    @override_settings(IMPORT_MAX_UPLOAD_SIZE=16)
+    def test_oversized_upload_is_rejected_and_removed(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(ImportJob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_rejected_uploads_are_removed(self):
+        cases = [
+            ([SimpleUploadedFile("feed.txt", self.feed)], {}),
+            ([SimpleUploadedFile("feed.csv", self.feed)], {"engine": "bulk"}),
+            ([SimpleUploadedFile("feed.csv", self.feed)], {"warning_logs": "all"}),
+            (
+                [
+                    SimpleUploadedFile("feed.csv", self.feed),
+                    SimpleUploadedFile("other.csv", self.feed),
+                ],
+                {},
+            ),
+        ]
+        for files, data in cases:
+            with self.subTest(files=[file.name for file in files], **data):
+                response = self.upload(*files, **data)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(ImportJob.objects.exists())
+                self.assertEqual(self.stored_files(), [])
+
+    def test_duplicate_upload_points_at_the_previous_job(self):
+        previous = ImportJob.objects.create(
+            file="imports/old.csv",
+            file_sha256=hashlib.sha256(self.feed).hexdigest(),
+            status="completed",
+            completed_at=timezone.now(),
+        )
+
+        response = self.upload()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], str(previous.id))
+        self.assertTrue(response.json()["duplicate"])
+        self.assertEqual(ImportJob.objects.count(), 1)
+        self.assertEqual(self.stored_files(), [])
+
+        response = self.upload(force="true")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ImportJob.objects.count(), 2)
+        self.assertEqual(self.stored_files(), ["feed.csv"])
+
+    def test_storage_without_paths_fails_the_system_check(self):
+        self.assertEqual(check_upload_storage(None), [])
+        with mock.patch(
+            "django.core.files.storage.default_storage.path",
+            side_effect=NotImplementedError,
+        ):
+            errors = check_upload_storage(None)
+        self.assertEqual([error.id for error in errors], ["importer.E001"])
+
+
+class MetricsTests(FeedJobMixin, TransactionTestCase):
+    rows = [make_row(id="SKU-1"), make_row(id="SKU-2", title=""), make_row(id="SKU-3")]
+
+    def test_counters_add_up_runs_and_survive_job_deletion(self):
+        self.run_job().delete()
+        self.run_job(rows=[make_row(id="SKU-4")])
+
+        with self.assertNumQueries(2):
+            metrics = self.client.get("/api/metrics").content.decode()
+        self.assertIn("import_rows_total 4\n", metrics)
+        self.assertIn('import_row_results_total{result="success"} 3\n', metrics)
+        self.assertIn('import_row_results_total{result="error"} 1\n', metrics)
+        self.assertIn('import_jobs{status="completed"} 1\n', metrics)
+        self.assertIn('import_stage_queries_total{stage="write"}', metrics)
+
+
+@override_settings(IMPORT_STALE_JOB_TIMEOUT=600, IMPORT_MAX_JOB_ATTEMPTS=3)
+class JobQueueTests(FeedJobMixin, TransactionTestCase):
+    def stale_job(self, attempts):
+        return ImportJob.objects.create(
+            file="imports/feed.csv",
+            status="processing",
+            worker_id="host:1",
+            attempts=attempts,
+            heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+
+    def test_pending_job_is_claimed_once(self):
+        job = ImportJob.objects.create(file="imports/feed.csv")
+
+        claimed = claim_next_job("host:1")
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(
+            (claimed.status, claimed.worker_id, claimed.attempts),
+            ("processing", "host:1", 1),
+        )
+        self.assertIsNotNone(claimed.heartbeat_at)
+        self.assertIsNone(claim_next_job("host:2"))
+
+    def test_stale_job_is_requeued(self):
+        job = self.stale_job(attempts=1)
+        running = self.stale_job(attempts=1)
+        ImportJob.objects.filter(pk=running.pk).update(heartbeat_at=timezone.now())
+
+        self.assertEqual(recover_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker_id), ("pending", ""))
+        self.assertFalse(ImportLog.objects.filter(job=job).exists())
+        running.refresh_from_db()
+        self.assertEqual(running.status, "processing")
+
+    def test_stale_job_fails_after_the_last_attempt(self):
+        job = self.stale_job(attempts=3)
+
+        self.assertEqual(recover_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(
+            ImportLog.objects.get(job=job).message,
+            "Processing failed: worker host:1 stopped responding after 3 attempts",
+        )
+        # Logged before the job changed, so its Last-Modified covers the log.
+        self.assertLessEqual(ImportLog.objects.get(job=job).created_at, job.updated_at)
+
+    def test_run_job_logs_the_failure(self):
+        job = ImportJob.objects.create(file="imports/missing.csv")
+
+        run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "failed")
+        failure = ImportLog.objects.get(
+            job=job, log_type="error", message__startswith="Processing failed: "
+        )
+        self.assertLessEqual(failure.created_at, job.updated_at)
+
+    def test_start_refreshes_the_heartbeat(self):
+        job = self.make_job([make_row()])
+        ImportJob.objects.filter(pk=job.pk).update(
+            status="processing", heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        processor = ExcelProductProcessor(job.id)
+        processor._start()
+
+        self.assertEqual(recover_stale_jobs(), 0)
+
+    @override_settings(IMPORT_HEARTBEAT_SECONDS=0.01)
+    def test_heartbeat_thread_keeps_a_long_phase_alive(self):
+        job = self.stale_job(attempts=1)
+        processor = ExcelProductProcessor(job.id)
+        with processor._heartbeat():
+            time.sleep(0.2)
+
+        self.assertEqual(recover_stale_jobs(), 0)
+
+
+class ImportJobProgressTests(SimpleTestCase):
+    now = timezone.now()
+
+    def progress(self, **fields):
+        job = ImportJob(file="imports/feed.csv", **fields)
+        with mock.patch("importer.serializers.timezone.now", return_value=self.now):
+            data = ImportJobSummarySerializer(job).data
+        return data["rows_per_second"], data["eta_seconds"]
+
+    def test_running_job(self):
+        self.assertEqual(
+            self.progress(
+                status="processing",
+                started_at=self.now - timedelta(seconds=10),
+                total_rows=100,
+                expected_rows=300,
+            ),
+            (10.0, 20),
+        )
+
+    def test_resumed_job_leaves_out_the_time_before_the_resume(self):
+        self.assertEqual(
+            self.progress(
+                status="processing",
+                started_at=self.now - timedelta(hours=1),
+                run_started_at=self.now - timedelta(seconds=10),
+                total_rows=150,
+                rows_before_run=100,
+                expected_rows=300,
+            ),
+            (5.0, 30),
+        )
+
+    def test_finished_job_is_measured_up_to_completed_at(self):
+        completed_at = self.now - timedelta(minutes=5)
+        job = dict(
+            started_at=completed_at - timedelta(seconds=4),
+            completed_at=completed_at,
+            total_rows=100,
+            expected_rows=300,
+        )
+        self.assertEqual(self.progress(status="completed", **job), (25.0, None))
+        self.assertEqual(self.progress(status="failed", **job), (25.0, None))
+
+    def test_no_rate_before_rows_are_read(self):
+        self.assertEqual(self.progress(status="pending"), (None, None))
+        self.assertEqual(
+            self.progress(status="processing", started_at=self.now, total_rows=0),
+            (None, None),
+        )
+
+
+class ImportJobLogListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.job = ImportJob.objects.create(file="imports/feed.csv")
+        ImportLog.objects.bulk_create(
+            ImportLog(
+                job=cls.job,
+                log_type="error" if row_number % 3 == 0 else "warning",
+                row_number=row_number,
+                message=f"Row {row_number}",
+            )
+            for row_number in range(2, 27)
+        )
+        cls.url = f"/api/import/{cls.job.id}/logs"
+
+    def test_detail_does_not_include_logs(self):
+        response = self.client.get(f"/api/import/{self.job.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("logs", response.json())
+
+    def test_cursor_pages_cover_every_log_once(self):
+        rows = []
+        url = f"{self.url}?page_size=10"
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 10)
+            rows += [log["row_number"] for log in page["results"]]
+            url = page["links"]["next"]
+        self.assertEqual(sorted(rows), list(range(2, 27)))
+
+    def test_filters(self):
+        response = self.client.get(
+            self.url, {"log_type": "error", "row_from": 5, "row_to": 20}
+        )
+        self.assertEqual(
+            sorted(log["row_number"] for log in response.json()["results"]),
+            [6, 9, 12, 15, 18],
+        )
+
+    def test_invalid_parameters(self):
+        for params in ({"log_type": "debug"}, {"row_from": "x"}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class Uuid7Tests(SimpleTestCase):
+    def test_keys_are_version_7_and_ordered(self):
+        keys = [uuid7() for _ in range(10000)]
+        self.assertEqual({key.version for key in keys}, {7})
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+
+
+class RowRangesTests(SimpleTestCase):
+    def test_adjacent_rows_collapse(self):
+        rows = RowRanges()
+        for row_num in [2, 3, 4, 8, 12, 13]:
+            rows.add(row_num)
+        self.assertEqual(rows.ranges, [[2, 4], [8, 8], [12, 13]])
+        self.assertEqual(rows.count, 6)
+        self.assertEqual(rows.describe(), "2-4, 8, 12-13")
+
+    def test_mostly_covered_span_lists_the_gaps(self):
+        rows = RowRanges([[1235, 50000], [2, 1233]])
+        self.assertEqual(rows.describe(), "2-50000 except 1234")
+
+
+@override_settings(
+    IMPORT_CHUNK_SIZE=2, IMPORT_MIN_CHUNK_SIZE=1, IMPORT_ADAPTIVE_CHUNK_SIZE=False
+)
+class WarningSummaryTests(FeedJobMixin, TransactionTestCase):
+    rows = [make_row(id=f"SKU-{number}", color="") for number in range(1, 8)]
+    rows[3] = make_row(id="SKU-4")
+
+    def warnings(self, job):
+        return list(
+            ImportLog.objects.filter(job=job, log_type="warning").values_list(
+                "row_number", "message", "details"
+            )
+        )
+
+    def test_warnings_are_summarized_across_chunks(self):
+        job = self.make_job()
+        ExcelProductProcessor(job.id).process()
+        job.refresh_from_db()
+
+        self.assertEqual(job.warning_count, 6)
+        self.assertEqual(
+            self.warnings(job),
+            [
+                (
+                    2,
+                    "Missing recommended field: color (6 rows: 2-8 except 5)",
+                    {
+                        "warning": "Missing recommended field: color",
+                        "count": 6,
+                        "rows": [[2, 4], [6, 8]],
+                    },
+                )
+            ],
+        )
+
+    def test_rows_mode_logs_every_row(self):
+        job = self.make_job(warning_logs="rows")
+        ExcelProductProcessor(job.id).process()
+
+        warnings = self.warnings(job)
+        self.assertEqual(
+            [row_num for row_num, message, details in warnings], [2, 3, 4, 6, 7, 8]
+        )
+        self.assertEqual({details for row_num, message, details in warnings}, {None})
+
+
+@override_settings(IMPORT_EVENTS_POLL_SECONDS=0.01)
+class ImportJobEventsTests(TransactionTestCase):
+    async def read_events(self, response):
+        events = []
+        async for chunk in response.streaming_content:
+            event, data = chunk.decode().strip().split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data[6:])))
+        return events
+
+    async def test_stream_ends_with_the_job(self):
+        job = await ImportJob.objects.acreate(
+            file="imports/feed.csv", status="processing", total_rows=10
+        )
+        response = await self.async_client.get(f"/api/import/{job.id}/events")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+
+        event, data = (await anext(stream)).decode().strip().split("\n")
+        self.assertEqual(event, "event: progress")
+        self.assertEqual(json.loads(data[6:])["total_rows"], 10)
+
+        await ImportLog.objects.acreate(
+            job=job, log_type="error", row_number=12, message="Missing title"
+        )
+        await ImportJob.objects.filter(pk=job.pk).aupdate(
+            status="completed", total_rows=20, error_count=1, updated_at=timezone.now()
+        )
+        events = await self.read_events(response)
+        self.assertEqual(
+            [event for event, data in events], ["errors", "progress", "end"]
+        )
+        self.assertEqual(events[0][1][0]["row_number"], 12)
+        self.assertEqual(events[1][1]["total_rows"], 20)
+
+    async def test_unknown_job(self):
+        response = await self.async_client.get(f"/api/import/{uuid7()}/events")
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalJobResponseTests(TestCase):
+    def setUp(self):
+        completed_job_responses.clear()
+        self.addCleanup(completed_job_responses.clear)
+        self.job = ImportJob.objects.create(
+            file="imports/feed.csv", status="processing", total_rows=10
+        )
+        ImportLog.objects.create(
+            job=self.job, log_type="error", row_number=2, message="Missing title"
+        )
+
+    def test_unchanged_job_is_not_modified(self):
+        for url in (f"/api/import/{self.job.id}/", f"/api/import/{self.job.id}/logs"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("Last-Modified", response)
+
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+
+    def test_progress_changes_the_etag(self):
+        url = f"/api/import/{self.job.id}/"
+        etag = self.client.get(url)["ETag"]
+        ImportJob.objects.filter(pk=self.job.pk).update(total_rows=20)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_rows"], 20)
+
+    def test_completed_job_is_served_from_the_cache(self):
+        self.job.status = "completed"
+        self.job.completed_at = timezone.now()
+        self.job.save()
+        url = f"/api/import/{self.job.id}/logs"
+        first = self.client.get(url)
+        self.assertIn("Last-Modified", first)
+
+        # Only the job's state is read to check the cached response.
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.json(), first.json())
+        self.assertEqual(response["ETag"], first["ETag"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+    def test_cached_response_follows_the_job(self):
+        self.job.status = "completed"
+        self.job.completed_at = timezone.now()
+        self.job.save()
+        url = f"/api/import/{self.job.id}/"
+        self.client.get(url)
+        self.assertEqual(len(completed_job_responses), 1)
+
+        # Saving bumps updated_at, as a job run again does.
+        self.job.total_rows = 20
+        self.job.save()
+        self.assertEqual(self.client.get(url).json()["total_rows"], 20)
+
+        self.job.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(len(completed_job_responses), 0)
+
+
+class TTLCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        with mock.patch(
+            "utils.cache.time.monotonic", return_value=time.monotonic() + 61
+        ):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,122 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+from .models import ImportJob
+
+
+def storage_has_paths(storage=default_storage):
+    # Uploads are written through the local path of their final storage
+    # name, which only file system storages have.
+    try:
+        storage.path("")
+    except NotImplementedError:
+        return False
+    return True
+
+
+class StoredUploadedFile(UploadedFile):
+    # An upload that was streamed straight to its final storage path.
+    # Assign ``storage_name`` to the job's FileField to reuse it without
+    # copying.
+
+    def __init__(self, storage_name, name, content_type, size, sha256, charset=None):
+        super().__init__(None, name, content_type, size, charset)
+        self.storage_name = storage_name
+        self.sha256 = sha256
+
+    def open(self, mode="rb"):
+        return default_storage.open(self.storage_name, mode)
+
+    def discard(self):
+        default_storage.delete(self.storage_name)
+
+
+class ImportUploadHandler(FileUploadHandler):
+    chunk_size = 1024 * 1024
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = getattr(settings, "IMPORT_MAX_UPLOAD_SIZE", 200 * 1024 * 1024)
+        self.error = None
+        self.extra_files = False
+        self._file = None
+        self._received = False
+        self._storage_name = None
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        if content_length > self.max_size:
+            self.error = (
+                f"File exceeds the maximum upload size of {self.max_size} bytes"
+            )
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        if field_name != "file":
+            raise SkipFile()
+        if self._received:
+            # Only one file is imported per request; further parts are
+            # never written, and the view rejects the request.
+            self.extra_files = True
+            raise SkipFile()
+        self._received = True
+
+        file_field = ImportJob._meta.get_field("file")
+        name = file_field.generate_filename(None, file_name)
+
+        os.makedirs(os.path.dirname(default_storage.path(name)), exist_ok=True)
+        while True:
+            name = default_storage.get_available_name(
+                name, max_length=file_field.max_length
+            )
+            try:
+                self._file = open(default_storage.path(name), "xb")
+            except FileExistsError:
+                continue
+            break
+
+        self._storage_name = name
+        self._sha256 = hashlib.sha256()
+        self._size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self._size += len(raw_data)
+        if self._size > self.max_size:
+            self.error = (
+                f"File exceeds the maximum upload size of {self.max_size} bytes"
+            )
+            self._discard()
+            raise StopUpload()
+
+        self._sha256.update(raw_data)
+        self._file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self._file.close()
+        self._file = None
+        return StoredUploadedFile(
+            self._storage_name,
+            self.file_name,
+            self.content_type,
+            file_size,
+            self._sha256.hexdigest(),
+            self.charset,
+        )
+
+    def upload_interrupted(self):
+        self._discard()
+
+    def _discard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            default_storage.delete(self._storage_name)
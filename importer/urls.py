@@ -8,4 +8,20 @@ urlpatterns = [
         views.ImportJobDetailView.as_view(),
         name="import-job-detail",
     ),
+    path(
+        "import/<uuid:pk>/logs",
+        views.ImportJobLogListView.as_view(),
+        name="import-job-logs",
+    ),
+    path(
+        "import/<uuid:pk>/events",
+        views.ImportJobEventsView.as_view(),
+        name="import-job-events",
+    ),
+    path(
+        "import/<uuid:pk>/resume",
+        views.ImportJobResumeView.as_view(),
+        name="import-job-resume",
+    ),
+    path("metrics", views.MetricsView.as_view(), name="import-metrics"),
 ]
@@ -1,20 +1,125 @@
+import hashlib
+
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
+from django.conf import settings
 from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views import View
+from .events import stream_job_events
+from .metrics import render_metrics
 from .models import ImportJob, ImportLog
-from .serializers import ImportJobSerializer, ImportLogSerializer
-from utils.excel_processor import ExcelProductProcessor
-import threading
+from .serializers import ImportJobSummarySerializer, ImportLogSerializer
+from .queue import resume_job
+from .uploads import ImportUploadHandler
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
-from utils.pagination import LogPagination
+from utils.cache import TTLCache
+from utils.enums import IMPORT_ENGINES, LOG_TYPES, WARNING_LOG_MODES
+from utils.pagination import LogCursorPagination
+from utils.readers import is_supported_file
+
+# Every field a job's responses are derived from. Chunks bump updated_at,
+# but a few single-field saves do not.
+JOB_STATE_FIELDS = [
+    "updated_at",
+    "status",
+    "completed_at",
+    "expected_rows",
+    "total_rows",
+    "success_count",
+    "unchanged_count",
+    "warning_count",
+    "error_count",
+    "last_committed_row",
+]
+
+# Serialized responses of completed jobs, which no longer change.
+completed_job_responses = TTLCache(
+    maxsize=getattr(settings, "IMPORT_RESPONSE_CACHE_SIZE", 256),
+    ttl=getattr(settings, "IMPORT_RESPONSE_CACHE_TTL", 300),
+)
+
+
+def _job_state(request, pk):
+    # Looked up once per request, with a single primary key query, and
+    # shared by the ETag and Last-Modified functions and the view.
+    if not hasattr(request, "_import_job_state"):
+        request._import_job_state = (
+            ImportJob.objects.filter(pk=pk).values(*JOB_STATE_FIELDS).first()
+        )
+    return request._import_job_state
+
+
+def _cached_response(request, state):
+    # Cached responses carry the state they were rendered from and are only
+    # served while the job still has it; a job that was deleted or run
+    # again drops its entry.
+    key = request.build_absolute_uri()
+    cached = completed_job_responses.get(key)
+    if cached is None:
+        return None
+    if cached[0] != state:
+        completed_job_responses.delete(key)
+        return None
+    return cached[1]
+
+
+def _job_etag(request, pk):
+    state = _job_state(request, pk)
+    if state is None:
+        return None
+    version = "|".join(str(state[field]) for field in JOB_STATE_FIELDS)
+    digest = hashlib.md5(
+        f"{version}|{request.get_full_path()}".encode(), usedforsecurity=False
+    ).hexdigest()
+    # Weak: the same data is rendered as JSON or as the browsable API.
+    return f'W/"{digest}"'
+
+
+def _job_last_modified(request, pk):
+    # Only finished jobs: HTTP dates have one-second resolution, and a
+    # running job commits several chunks a second.
+    state = _job_state(request, pk)
+    if state is None or state["status"] not in ("completed", "failed"):
+        return None
+    return state["updated_at"]
+
+
+class ConditionalJobMixin:
+    # GET for the responses of one job (pk in the URL). Answers
+    # If-None-Match and If-Modified-Since with 304 from the job's state
+    # alone, before any logs are read or serialized, and serves completed
+    # jobs from completed_job_responses.
+
+    @method_decorator(
+        condition(etag_func=_job_etag, last_modified_func=_job_last_modified)
+    )
+    def get(self, request, *args, **kwargs):
+        state = _job_state(request, kwargs["pk"])
+        cached = _cached_response(request, state)
+        if cached is not None:
+            return Response(cached)
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200 and state["status"] == "completed":
+            # Keyed by the absolute URI: log pages hold absolute next links.
+            completed_job_responses.set(
+                request.build_absolute_uri(), (state, response.data)
+            )
+        return response
 
 
 @extend_schema_view(
     post=extend_schema(
         operation_id="import_products",
-        summary="Import products from Excel",
-        description="Upload an Excel file to import product data in bulk",
+        summary="Import products from Excel or CSV",
+        description="Upload an Excel (.xlsx), CSV, TSV or gzipped CSV (.csv.gz) "
+        "file to import product data in bulk",
         request={
             "multipart/form-data": {
                 "type": "object",
@@ -22,8 +127,26 @@ from utils.pagination import LogPagination
                     "file": {
                         "type": "string",
                         "format": "binary",
-                        "description": "Excel file with product data",
-                    }
+                        "description": "Excel, CSV, TSV or .csv.gz file with "
+                        "product data",
+                    },
+                    "engine": {
+                        "type": "string",
+                        "enum": [engine for engine, label in IMPORT_ENGINES],
+                        "description": "Write engine for this job; 'copy' "
+                        "stages rows with PostgreSQL COPY",
+                    },
+                    "warning_logs": {
+                        "type": "string",
+                        "enum": [mode for mode, label in WARNING_LOG_MODES],
+                        "description": "'summary' logs each warning once with "
+                        "the rows it affects; 'rows' logs every row",
+                    },
+                    "force": {
+                        "type": "boolean",
+                        "description": "Import the file even if an identical "
+                        "file was already imported",
+                    },
                 },
             }
         },
@@ -32,42 +155,87 @@ from utils.pagination import LogPagination
 class ImportProductView(generics.CreateAPIView):
     parser_classes = [MultiPartParser]
     queryset = ImportJob.objects.all()
-    serializer_class = ImportJobSerializer
+    serializer_class = ImportJobSummarySerializer
+
+    def dispatch(self, request, *args, **kwargs):
+        # Uploads are streamed straight into MEDIA/imports/ while being
+        # hashed, instead of being spooled to a temporary file and copied.
+        self.upload_handler = ImportUploadHandler(request)
+        request.upload_handlers = [self.upload_handler]
+        return super().dispatch(request, *args, **kwargs)
 
     def create(self, request, *args, **kwargs):
         file = request.FILES.get("file")
+        if self.upload_handler.error:
+            return Response(
+                {"error": self.upload_handler.error},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
         if not file:
             return Response(
                 {"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST
             )
 
-        if not file.name.endswith(".xlsx"):
+        if self.upload_handler.extra_files:
+            file.discard()
             return Response(
-                {"error": "Only Excel (.xlsx) files are supported"},
+                {"error": "Only one file can be imported per request"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        import_job = ImportJob.objects.create(file=file)
+        if not is_supported_file(file.name):
+            file.discard()
+            return Response(
+                {"error": "Only .xlsx, .csv, .tsv and .csv.gz files are supported"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        def process_import():
-            try:
-                processor = ExcelProductProcessor(import_job.id)
-                processor.process()
+        engine = request.data.get(
+            "engine", getattr(settings, "IMPORT_DEFAULT_ENGINE", "orm")
+        )
+        if engine not in dict(IMPORT_ENGINES):
+            file.discard()
+            return Response(
+                {"error": f"Unknown import engine: {engine}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-            except Exception as e:
-                import_job.status = "failed"
-                import_job.save()
-                ImportLog.objects.create(
-                    job=import_job,
-                    log_type="error",
-                    message=f"Processing failed: {str(e)}",
-                )
+        warning_logs = request.data.get(
+            "warning_logs", getattr(settings, "IMPORT_WARNING_LOGS", "summary")
+        )
+        if warning_logs not in dict(WARNING_LOG_MODES):
+            file.discard()
+            return Response(
+                {"error": f"Unknown warning log mode: {warning_logs}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        force = str(request.data.get("force", "")).lower() in ("1", "true", "yes")
+        if not force:
+            previous_job = (
+                ImportJob.objects.filter(file_sha256=file.sha256, status="completed")
+                .order_by("-completed_at")
+                .first()
+            )
+            if previous_job is not None:
+                # The same feed was already imported; point the client at
+                # those results instead of rewriting the whole catalogue.
+                file.discard()
+                response_data = ImportJobSummarySerializer(previous_job).data
+                response_data["duplicate"] = True
+                return Response(response_data, status=status.HTTP_200_OK)
 
-        thread = threading.Thread(target=process_import)
-        thread.start()
+        # The job stays pending until a run_import_workers process claims it.
+        import_job = ImportJob.objects.create(
+            file=file.storage_name,
+            file_sha256=file.sha256,
+            engine=engine,
+            warning_logs=warning_logs,
+        )
 
         return Response(
-            ImportJobSerializer(import_job).data, status=status.HTTP_201_CREATED
+            ImportJobSummarySerializer(import_job).data, status=status.HTTP_201_CREATED
         )
 
 
@@ -75,11 +243,37 @@ class ImportProductView(generics.CreateAPIView):
     get=extend_schema(
         operation_id="get_import_job_details",
         summary="Get import job details",
-        description="Retrieve details of a specific import job, including logs",
+        description="Retrieve the status and progress of a specific import job. "
+        "Logs are listed separately by /api/import/<uuid>/logs.",
+    )
+)
+class ImportJobDetailView(ConditionalJobMixin, generics.RetrieveAPIView):
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSummarySerializer
+
+
+@extend_schema_view(
+    get=extend_schema(
+        operation_id="list_import_job_logs",
+        summary="List import job logs",
+        description="Cursor-paginated logs of an import job in the order they "
+        "were written, optionally filtered by type and row range",
         parameters=[
             OpenApiParameter(
-                name="page",
-                description="Page number for paginated logs",
+                name="log_type",
+                description="Only logs of these types (comma separated)",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="row_from",
+                description="Only logs for this row number or later",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="row_to",
+                description="Only logs for this row number or earlier",
                 required=False,
                 type=int,
             ),
@@ -92,20 +286,93 @@ class ImportProductView(generics.CreateAPIView):
         ],
     )
 )
-class ImportJobDetailView(generics.RetrieveAPIView):
+class ImportJobLogListView(ConditionalJobMixin, generics.ListAPIView):
+    serializer_class = ImportLogSerializer
+    pagination_class = LogCursorPagination
+
+    def get_queryset(self):
+        job = get_object_or_404(ImportJob.objects.only("pk"), pk=self.kwargs["pk"])
+        logs = ImportLog.objects.filter(job=job)
+        params = self.request.query_params
+
+        if params.get("log_type"):
+            log_types = params["log_type"].split(",")
+            unknown = set(log_types) - {log_type for log_type, label in LOG_TYPES}
+            if unknown:
+                raise ValidationError(
+                    {"log_type": f"Unknown log type: {', '.join(sorted(unknown))}"}
+                )
+            logs = logs.filter(log_type__in=log_types)
+
+        for param, lookup in (
+            ("row_from", "row_number__gte"),
+            ("row_to", "row_number__lte"),
+        ):
+            if params.get(param):
+                try:
+                    logs = logs.filter(**{lookup: int(params[param])})
+                except ValueError:
+                    raise ValidationError({param: "Must be an integer"})
+
+        return logs
+
+
+@extend_schema_view(
+    post=extend_schema(
+        operation_id="resume_import_job",
+        summary="Resume an import job",
+        description="Queue a failed or stalled import job again. It continues "
+        "after the last committed row with its counters intact.",
+        request=None,
+    )
+)
+class ImportJobResumeView(generics.GenericAPIView):
     queryset = ImportJob.objects.all()
-    serializer_class = ImportJobSerializer
+    serializer_class = ImportJobSummarySerializer
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
+    def post(self, request, *args, **kwargs):
+        import_job = self.get_object()
+        if not import_job.file or not import_job.file.storage.exists(
+            import_job.file.name
+        ):
+            return Response(
+                {"error": "The uploaded file for this job no longer exists"},
+                status=status.HTTP_409_CONFLICT,
+            )
 
-        logs = ImportLog.objects.filter(job=instance)
-        paginator = LogPagination()
-        paginated_logs = paginator.paginate_queryset(logs, request)
-        log_serializer = ImportLogSerializer(paginated_logs, many=True)
+        if not resume_job(import_job):
+            return Response(
+                {
+                    "error": f"Import jobs that are {import_job.status} cannot be resumed"
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
 
-        response_data = serializer.data
-        response_data["logs"] = log_serializer.data
+        return Response(
+            self.get_serializer(import_job).data, status=status.HTTP_202_ACCEPTED
+        )
 
-        return paginator.get_paginated_response(response_data)
+
+class MetricsView(View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+class ImportJobEventsView(View):
+    # Server-Sent Events: "progress" with the job's counters whenever they
+    # change, "errors" with samples of newly logged errors and "end" once
+    # the job has finished. Needs the ASGI application to hold many streams
+    # open; under WSGI every stream ties up a worker thread.
+    async def get(self, request, pk):
+        if not await ImportJob.objects.filter(pk=pk).aexists():
+            raise Http404("Import job not found")
+
+        response = StreamingHttpResponse(
+            stream_job_events(pk), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # Stops nginx from buffering the stream.
+        response["X-Accel-Buffering"] = "no"
+        return response
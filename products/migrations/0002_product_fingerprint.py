@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="fingerprint",
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:34
+
+import utils.common
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_product_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="id",
+            field=models.UUIDField(
+                db_index=True,
+                default=utils.common.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -1,6 +1,46 @@
+import hashlib
+from decimal import Decimal, InvalidOperation
+
 from django.db import models
 from utils.common import CommonModel
 
+FINGERPRINT_FIELDS = [
+    "title",
+    "description",
+    "link",
+    "image_link",
+    "availability",
+    "price",
+    "condition",
+    "brand",
+    "gtin",
+    "sale_price",
+    "item_group_id",
+    "google_product_category",
+    "product_type",
+    "size",
+    "color",
+    "material",
+    "pattern",
+    "gender",
+    "model",
+]
+
+
+def product_fingerprint(values):
+    # Hash of the imported field values. Prices are normalized to two
+    # decimals so a float from a feed and the stored Decimal agree.
+    parts = []
+    for field in FINGERPRINT_FIELDS:
+        value = values.get(field)
+        if field in ("price", "sale_price") and value is not None:
+            try:
+                value = Decimal(str(value)).quantize(Decimal("0.01"))
+            except InvalidOperation:
+                pass
+        parts.append("" if value is None else str(value))
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).hexdigest()
+
 
 class Product(CommonModel):
     sku = models.CharField(max_length=100, unique=True)
@@ -28,6 +68,17 @@ class Product(CommonModel):
     pattern = models.CharField(max_length=100, blank=True, null=True)
     gender = models.CharField(max_length=20, blank=True, null=True)
     model = models.CharField(max_length=100, blank=True, null=True)
+    fingerprint = models.CharField(max_length=32, blank=True, null=True)
 
     def __str__(self):
         return f"{self.sku} - {self.title}"
+
+    def save(self, *args, **kwargs):
+        # Keep the fingerprint in step with edits made outside the importer,
+        # so the next import does not skip a product that was changed.
+        self.fingerprint = product_fingerprint(
+            {field: getattr(self, field) for field in FINGERPRINT_FIELDS}
+        )
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "fingerprint"}
+        super().save(*args, **kwargs)
@@ -0,0 +1,92 @@
+MAX_HISTORY = 200
+
+
+class AdaptiveChunkSizer:
+    # Picks the number of rows per chunk from the write latency of the
+    # chunks before it. Each observation moves the size towards
+    # target_seconds, by at most a factor of two per chunk, and a chunk
+    # whose transaction failed halves it. Size changes are kept as
+    # (first_row, size) pairs for the job profile.
+
+    def __init__(self, initial, minimum, maximum, target_seconds, adaptive=True):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.target_seconds = target_seconds
+        self.adaptive = adaptive
+        self.initial = self._clamp(initial)
+        self.size = self.initial
+        self.chunks = 0
+        self.retries = 0
+        self.rows = 0
+        self.smallest = None
+        self.largest = None
+        self.last_row = 0
+        self.history = []
+
+    def _clamp(self, size):
+        return min(self.maximum, max(self.minimum, int(size)))
+
+    def observe(self, first_row, rows, seconds):
+        # A committed chunk of ``rows`` rows starting at ``first_row``.
+        self.chunks += 1
+        self.rows += rows
+        self.smallest = rows if self.smallest is None else min(self.smallest, rows)
+        self.largest = rows if self.largest is None else max(self.largest, rows)
+        self.last_row = max(self.last_row, first_row + rows - 1)
+        if not self.adaptive or not rows:
+            return
+
+        if seconds <= 0:
+            size = self.size * 2
+        else:
+            ideal = self.target_seconds * rows / seconds
+            size = min(self.size * 2, max(self.size / 2, ideal))
+        size = self._clamp(size)
+
+        # Small corrections are ignored so the size does not jitter.
+        if abs(size - self.size) > self.size * 0.1:
+            self._resize(first_row + rows, size)
+
+    def retry(self, first_row, rows):
+        # A chunk whose transaction failed and is tried again. It is not
+        # counted as a chunk until it commits.
+        self.retries += 1
+        if self.adaptive and rows:
+            self._resize(first_row + rows, self._clamp(self.size // 2))
+
+    def _resize(self, row, size):
+        self.size = size
+        if len(self.history) < MAX_HISTORY:
+            self.history.append([row, size])
+
+    def as_dict(self):
+        return {
+            "adaptive": self.adaptive,
+            "target_seconds": self.target_seconds,
+            "initial": self.initial,
+            "final": self.size,
+            "chunks": self.chunks,
+            "retries": self.retries,
+            "smallest": self.smallest,
+            "largest": self.largest,
+            "mean": round(self.rows / self.chunks, 1) if self.chunks else None,
+            "last_row": self.last_row,
+            "history": self.history,
+        }
+
+    def merge(self, summary):
+        # Folds in the summary of a sizer that ran in another process.
+        self.retries += summary.get("retries", 0)
+        if not summary["chunks"]:
+            return
+        for value in (summary["smallest"], summary["largest"]):
+            self.smallest = (
+                value if self.smallest is None else min(self.smallest, value)
+            )
+            self.largest = value if self.largest is None else max(self.largest, value)
+        self.chunks += summary["chunks"]
+        self.rows += round(summary["mean"] * summary["chunks"])
+        if summary["last_row"] > self.last_row:
+            self.size = summary["final"]
+            self.last_row = summary["last_row"]
+        self.history = sorted(self.history + summary["history"])[:MAX_HISTORY]
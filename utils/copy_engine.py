@@ -0,0 +1,172 @@
+import io
+from decimal import ROUND_HALF_UP, Decimal
+from uuid import uuid4
+
+from django.db import models
+
+from products.models import Product
+from utils.common import uuid7
+
+
+def _constraint_checks(fields):
+    checks = []
+    for name in fields:
+        field = Product._meta.get_field(name)
+        max_abs = quantum = None
+        if isinstance(field, models.DecimalField):
+            max_abs = 10 ** (field.max_digits - field.decimal_places)
+            quantum = Decimal(1).scaleb(-field.decimal_places)
+        checks.append(
+            (name, field.column, field.null, field.max_length, max_abs, quantum)
+        )
+    return checks
+
+
+def constraint_error(product_data, checks):
+    # The COPY engine writes every staged row in a single statement, so rows
+    # that the database would reject are caught here instead, with the same
+    # messages PostgreSQL gives.
+    for name, column, null, max_length, max_abs, quantum in checks:
+        value = product_data.get(name)
+        if value is None:
+            if not null:
+                return (
+                    f'null value in column "{column}" of relation '
+                    f'"{Product._meta.db_table}" violates not-null constraint'
+                )
+            continue
+        if max_length is not None and len(str(value)) > max_length:
+            return f"value too long for type character varying({max_length})"
+        if max_abs is not None:
+            # PostgreSQL rounds to the column's scale, half away from zero,
+            # before checking the precision, so 99999999.995 overflows
+            # numeric(10, 2).
+            number = Decimal(str(value))
+            if number.is_finite():
+                number = number.quantize(quantum, rounding=ROUND_HALF_UP)
+            if not number.is_nan() and abs(number) >= max_abs:
+                return "numeric field overflow"
+    return None
+
+
+def _copy_text(value):
+    # PostgreSQL COPY text format, for psycopg2's copy_expert.
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyStagingWriter:
+    # PostgreSQL only. Validated rows are streamed into a temporary staging
+    # table with COPY FROM STDIN as the file is read; merge() then writes
+    # them into products_product with one INSERT ... ON CONFLICT (sku) DO
+    # UPDATE. Temporary tables are not WAL-logged and the rows are kept
+    # across the per-chunk commits until the table is dropped.
+
+    def __init__(self, connection, fields):
+        self.connection = connection
+        self.fields = [*fields, "fingerprint"]
+        self.checks = _constraint_checks(fields)
+        self.table = f"import_staging_{uuid4().hex}"
+
+    def _columns(self):
+        quote = self.connection.ops.quote_name
+        return ["row_number", "id", *(quote(field) for field in self.fields)]
+
+    def create(self):
+        quote = self.connection.ops.quote_name
+        columns = ["row_number integer NOT NULL", "id uuid NOT NULL"] + [
+            f"{quote(field)} "
+            f"{Product._meta.get_field(field).db_type(self.connection)}"
+            for field in self.fields
+        ]
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {self.table} ({', '.join(columns)}) "
+                "ON COMMIT PRESERVE ROWS"
+            )
+
+    def drop(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def stage(self, rows):
+        # Copies [(row_num, product_data)] into the staging table and returns
+        # {row_num: message} for rows the database would reject.
+        errors = {}
+        records = []
+        for row_num, product_data in rows:
+            error = constraint_error(product_data, self.checks)
+            if error:
+                errors[row_num] = error
+                continue
+            records.append(
+                (row_num, uuid7(), *(product_data[field] for field in self.fields))
+            )
+
+        if records:
+            self._copy(records)
+        return errors
+
+    def _copy(self, records):
+        sql = f"COPY {self.table} ({', '.join(self._columns())}) FROM STDIN"
+        with self.connection.cursor() as cursor:
+            if hasattr(cursor, "copy"):
+                # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for record in records:
+                        copy.write_row(record)
+                return
+
+            # psycopg2
+            buffer = io.StringIO()
+            for record in records:
+                buffer.write("\t".join(_copy_text(value) for value in record))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+
+    def merge(self):
+        # Returns (staged, written, unchanged): staged rows, including the
+        # earlier rows of repeated SKUs. Only the last staged row of each SKU
+        # is merged, and products whose stored fingerprint already matches
+        # are left alone and counted as unchanged.
+        quote = self.connection.ops.quote_name
+        table = quote(Product._meta.db_table)
+        columns = [quote(field) for field in self.fields]
+        updates = [
+            f"{column} = EXCLUDED.{column}"
+            for column in columns
+            if column != quote("sku")
+        ]
+        sql = f"""
+            WITH latest AS (
+                SELECT DISTINCT ON (sku) *
+                FROM {self.table}
+                ORDER BY sku, row_number DESC
+            ), written AS (
+                INSERT INTO {table} (id, created_at, updated_at, {", ".join(columns)})
+                SELECT latest.id, now(), now(),
+                    {", ".join(f"latest.{column}" for column in columns)}
+                FROM latest
+                LEFT JOIN {table} AS stored ON stored.sku = latest.sku
+                WHERE stored.fingerprint IS DISTINCT FROM latest.fingerprint
+                ON CONFLICT (sku) DO UPDATE SET
+                    {", ".join(updates)}, updated_at = EXCLUDED.updated_at
+                RETURNING 1
+            )
+            SELECT
+                (SELECT count(*) FROM {self.table}),
+                (SELECT count(*) FROM written),
+                (SELECT count(*) FROM latest)
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql)
+            staged, written, merged = cursor.fetchone()
+        return staged, written, merged - written
@@ -0,0 +1,14 @@
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    # connection_created receiver. Applies settings.SQLITE_PRAGMAS to every
+    # new SQLite connection, in order, so busy_timeout is in place before
+    # journal_mode needs the write lock.
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
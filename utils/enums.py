@@ -9,3 +9,11 @@ LOG_TYPES = [
     ("warning", "Warning"),
     ("info", "Info"),
 ]
+IMPORT_ENGINES = [
+    ("orm", "ORM bulk upsert"),
+    ("copy", "PostgreSQL COPY staging table"),
+]
+WARNING_LOG_MODES = [
+    ("summary", "One entry per warning with the rows it affects"),
+    ("rows", "One entry per row"),
+]
@@ -1,181 +1,797 @@
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
+
 import pandas as pd
-from openpyxl import load_workbook
-from django.db import transaction
-from products.models import Product
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    OperationalError,
+    connections,
+    reset_queries,
+    transaction,
+)
+from django.db.models import F
+from django.utils import timezone
+from products.models import Product, product_fingerprint
+from importer.metrics import COUNT_FIELDS, record_run
 from importer.models import ImportJob, ImportLog
+from utils.headers import COLUMN_INDEX, FEED_COLUMNS, HeaderError, HeaderMap
+from utils.import_log import ImportLogBuffer
+from utils.memory import (
+    MemoryMonitor,
+    intern_columns,
+    peak_rss_bytes,
+    reset_peak_rss,
+)
+from utils.profiling import StageProfiler
+from utils.chunking import AdaptiveChunkSizer
+from utils.copy_engine import CopyStagingWriter
+from utils.readers import get_reader
+from utils.row_ranges import RowRanges
 from utils.validators import ProductValidator
 
+PRODUCT_FIELDS = [
+    "sku",
+    "title",
+    "description",
+    "link",
+    "image_link",
+    "availability",
+    "price",
+    "condition",
+    "brand",
+    "gtin",
+    "sale_price",
+    "item_group_id",
+    "google_product_category",
+    "product_type",
+    "size",
+    "color",
+    "material",
+    "pattern",
+    "gender",
+    "model",
+]
+PRODUCT_COLUMN_INDICES = [
+    (field, COLUMN_INDEX["id" if field == "sku" else field]) for field in PRODUCT_FIELDS
+]
+SKU_INDEX = COLUMN_INDEX["id"]
+CATEGORICAL_INDICES = [
+    COLUMN_INDEX[column] for column in ("brand", "availability", "condition", "gender")
+]
+
+
+def _process_partition(
+    import_job_id, using, partition_path, first_row_num, superseded_rows
+):
+    processor = ExcelProductProcessor(import_job_id, using=using)
+    # Partitions commit in any order, so parallel jobs have no checkpoints,
+    # whatever IMPORT_PARALLEL_WORKERS says in the worker.
+    processor.checkpoints = False
+    # Forked workers inherit the parent's peak; each partition reports its own.
+    reset_peak_rss()
+    with open(partition_path, "rb") as partition_file:
+        rows = pickle.load(partition_file)
+
+    try:
+        with processor.connection.execute_wrapper(processor.profiler):
+            processor._process_partition(rows, first_row_num, superseded_rows)
+        return processor._profile(), processor.failed_rows, peak_rss_bytes()
+    finally:
+        processor.log_buffer.flush()
+        connections.close_all()
+
 
 class ExcelProductProcessor:
-    def __init__(self, import_job_id):
-        self.import_job = ImportJob.objects.get(id=import_job_id)
-        self.chunk_size = 100
+    def __init__(self, import_job_id, workers=None, using=DEFAULT_DB_ALIAS):
+        # ``using`` is the database alias every query of the import runs on.
+        self.using = using
+        self.connection = connections[using]
+        self.import_job = ImportJob.objects.using(using).get(id=import_job_id)
+        self.workers = workers or getattr(settings, "IMPORT_PARALLEL_WORKERS", 1)
+        self.partition_size = getattr(settings, "IMPORT_PARTITION_SIZE", 10000)
+        self.validation_mode = getattr(settings, "IMPORT_VALIDATION_MODE", "rows")
+        log_buffer_size = getattr(settings, "IMPORT_LOG_BUFFER_SIZE", 500)
+        max_chunk_size = getattr(settings, "IMPORT_MAX_CHUNK_SIZE", 5000)
+
+        # With a memory budget, fewer rows and log entries are held at once
+        # and peak memory is reported when the job ends.
+        self.memory_monitor = None
+        self.worker_peak_rss = None
+        budget_mb = getattr(settings, "IMPORT_MEMORY_BUDGET_MB", None)
+        if budget_mb:
+            row_buffer = getattr(settings, "IMPORT_MEMORY_ROW_BUFFER", 1000)
+            self.partition_size = min(self.partition_size, row_buffer)
+            max_chunk_size = min(max_chunk_size, row_buffer)
+            log_buffer_size = min(log_buffer_size, row_buffer)
+            self.memory_monitor = MemoryMonitor(
+                budget_bytes=budget_mb * 1024 * 1024,
+                trace=getattr(settings, "IMPORT_MEMORY_TRACE", False),
+            )
+
+        self.log_buffer = ImportLogBuffer(
+            self.import_job, buffer_size=log_buffer_size, using=using
+        )
+        self.profiler = StageProfiler()
+        self.chunk_sizer = AdaptiveChunkSizer(
+            initial=getattr(settings, "IMPORT_CHUNK_SIZE", 100),
+            minimum=getattr(settings, "IMPORT_MIN_CHUNK_SIZE", 10),
+            maximum=max_chunk_size,
+            target_seconds=getattr(settings, "IMPORT_CHUNK_TARGET_SECONDS", 0.5),
+            adaptive=getattr(settings, "IMPORT_ADAPTIVE_CHUNK_SIZE", True),
+        )
+        self.chunk_retries = getattr(settings, "IMPORT_CHUNK_RETRIES", 2)
+        self.heartbeat_interval = getattr(settings, "IMPORT_HEARTBEAT_SECONDS", 30)
+        self.copy_writer = None
+        # Rows whose product the database rejected.
+        self.failed_rows = set()
+        self.summarize_warnings = self.import_job.warning_logs == "summary"
+
+        # Sequential ORM imports record the last committed row with every
+        # chunk; a job that already has one continues after it with its
+        # counters intact. COPY jobs stage rows on a connection that does not
+        # survive a crash, and partitions commit out of order, so those
+        # start over instead.
+        self.checkpoints = self.import_job.engine != "copy" and self.workers == 1
+        self.resume_from = self.import_job.last_committed_row if self.checkpoints else 0
 
     def process(self):
+        status = "failed"
         try:
-            self.import_job.status = "processing"
+            self._start()
+            if self.memory_monitor:
+                self.memory_monitor.start()
+
+            with self.connection.execute_wrapper(self.profiler), get_reader(
+                self.import_job.file.path
+            ) as reader:
+                if reader.expected_rows is not None:
+                    self.import_job.expected_rows = reader.expected_rows
+                    self.import_job.save(update_fields=["expected_rows"])
+
+                rows = reader.iter_rows(skip_rows=max(self.resume_from - 1, 0))
+                header_map = self._read_header(rows)
+                rows = map(header_map, rows)
+                if self.memory_monitor:
+                    rows = map(
+                        partial(intern_columns, indices=CATEGORICAL_INDICES), rows
+                    )
+                if self.import_job.engine == "copy":
+                    self._process_copy(rows)
+                elif self.workers > 1:
+                    self._process_parallel(rows)
+                else:
+                    self._process_sequential(rows, last_row_num=self.resume_from or 1)
+
+            status = "completed"
+
+        finally:
+            # The last log entries are written before the status changes, so
+            # a finished job and its logs do not change after updated_at.
+            try:
+                if self.memory_monitor:
+                    self._report_memory()
+                self.log_buffer.flush()
+                if self.summarize_warnings:
+                    self._merge_warning_summaries()
+            finally:
+                self._finish(status)
+
+    def _report_memory(self):
+        message, over_budget = self.memory_monitor.stop(self.worker_peak_rss)
+        self.log_buffer.add("info", f"Memory: {message}")
+        if over_budget:
+            self.log_buffer.add("warning", "Peak memory exceeded the import budget")
+
+    def _start(self):
+        self.import_job.status = "processing"
+        self.import_job.completed_at = None
+        self.import_job.heartbeat_at = timezone.now()
+        self.import_job.run_started_at = self.import_job.heartbeat_at
+        if self.resume_from:
+            self.import_job.rows_before_run = self.import_job.total_rows
+            self.import_job.save(
+                update_fields=[
+                    "status",
+                    "completed_at",
+                    "heartbeat_at",
+                    "run_started_at",
+                    "rows_before_run",
+                    "updated_at",
+                ]
+            )
+            self.log_buffer.add("info", f"Resuming after row {self.resume_from}")
+            return
+
+        self.import_job.started_at = self.import_job.run_started_at
+        self.import_job.rows_before_run = 0
+        self.import_job.last_committed_row = 0
+        self.import_job.total_rows = 0
+        self.import_job.success_count = 0
+        self.import_job.unchanged_count = 0
+        self.import_job.warning_count = 0
+        self.import_job.error_count = 0
+        # A job that starts over (requeued after its worker died, or run
+        # without checkpoints) drops the logs of its earlier attempts along
+        # with their counts.
+        with transaction.atomic(using=self.using):
+            ImportLog.objects.using(self.using).filter(job=self.import_job).delete()
             self.import_job.save()
 
-            excel_file = self.import_job.file.path
-            workbook = load_workbook(excel_file, read_only=True)
-            sheet = workbook.active
-
-            total_rows = 0
-            success_count = 0
-            warning_count = 0
-            error_count = 0
-
-            rows = sheet.iter_rows(min_row=2, values_only=True)
-            chunk = []
-            for row_num, row in enumerate(rows, start=2):
-                chunk.append(row)
-                if len(chunk) == self.chunk_size:
-                    total_rows += len(chunk)
-                    chunk_success, chunk_warning, chunk_error = self._process_chunk(
-                        chunk, row_num
+    def _finish(self, status):
+        # Counters are maintained in the database by _record_progress, so
+        # only the status fields are written back.
+        counts = (
+            ImportJob.objects.using(self.using)
+            .filter(pk=self.import_job.pk)
+            .values(*COUNT_FIELDS)
+            .get()
+        )
+        profile = self._profile()
+        self.import_job.status = status
+        self.import_job.completed_at = timezone.now()
+        previous_profile = self.import_job.profile if self.resume_from else None
+        self.import_job.profile = self._merge_profile(previous_profile, profile)
+        with transaction.atomic(using=self.using):
+            self.import_job.save(
+                update_fields=["status", "completed_at", "profile", "updated_at"]
+            )
+            # The counts loaded with the job are the earlier runs' when
+            # resuming, so only this run's rows are added.
+            record_run(
+                {
+                    field: counts[field] - getattr(self.import_job, field)
+                    for field in COUNT_FIELDS
+                },
+                profile,
+                self.using,
+            )
+
+    def _merge_profile(self, previous, profile):
+        # A resumed job keeps the stages and chunks of its earlier runs.
+        if not previous:
+            return profile
+        profiler = StageProfiler()
+        profiler.merge(previous)
+        profiler.merge(profile)
+        self.chunk_sizer.merge(previous["chunk_sizes"])
+        return {
+            **profile,
+            **profiler.as_dict(),
+            "chunk_sizes": self.chunk_sizer.as_dict(),
+        }
+
+    def _profile(self):
+        profile = self.profiler.as_dict()
+        profile["engine"] = self.import_job.engine
+        profile["chunk_sizes"] = self.chunk_sizer.as_dict()
+        if self.worker_peak_rss:
+            profile["worker_peak_rss_bytes"] = self.worker_peak_rss
+        return profile
+
+    def _read_header(self, rows):
+        try:
+            header_row = next(rows)
+        except StopIteration:
+            raise HeaderError("The file is empty")
+
+        header_map = HeaderMap(header_row)
+        if header_map.missing_columns and not self.resume_from:
+            self.log_buffer.add(
+                "info",
+                f"Columns not in file: {', '.join(header_map.missing_columns)}",
+            )
+        return header_map
+
+    def _process_sequential(self, rows, last_row_num=1):
+        while True:
+            with self.profiler.stage("read"):
+                chunk = list(islice(rows, self.chunk_sizer.size))
+            if not chunk:
+                break
+
+            last_row_num += len(chunk)
+            self._process_chunk(chunk, last_row_num)
+
+    def _process_copy(self, rows):
+        # Chunks are validated and logged as usual but staged with COPY, and
+        # the products are written by a single merge once the whole file is
+        # staged. The staging table belongs to this connection, so the COPY
+        # engine always runs in one process.
+        if self.connection.vendor != "postgresql":
+            self.log_buffer.add(
+                "info", "The copy engine needs PostgreSQL; using the ORM engine"
+            )
+            self._process_sequential(rows)
+            return
+
+        self.copy_writer = CopyStagingWriter(self.connection, PRODUCT_FIELDS)
+        self.copy_writer.create()
+        try:
+            self._process_sequential(rows)
+            with self.profiler.stage("write"), self._heartbeat():
+                with transaction.atomic(using=self.using):
+                    staged, written, unchanged = self.copy_writer.merge()
+                    # Staged rows are only counted once the merge commits.
+                    self._record_progress(
+                        success_count=staged - unchanged, unchanged_count=unchanged
                     )
-                    success_count += chunk_success
-                    warning_count += chunk_warning
-                    error_count += chunk_error
-                    chunk = []
-
-            if chunk:
-                total_rows += len(chunk)
-                chunk_success, chunk_warning, chunk_error = self._process_chunk(
-                    chunk, row_num
+            self.log_buffer.add(
+                "info",
+                f"Merged {written} products from the staging table "
+                f"({unchanged} unchanged)",
+            )
+        finally:
+            self.copy_writer.drop()
+            self.copy_writer = None
+
+    @contextmanager
+    def _heartbeat(self):
+        # Keeps heartbeat_at fresh from a thread, with its own connection,
+        # through phases that commit no chunks: the spill of a parallel job
+        # and the COPY merge. Otherwise recover_stale_jobs would requeue a
+        # job that is still running.
+        stop = threading.Event()
+
+        def beat():
+            try:
+                while not stop.wait(self.heartbeat_interval):
+                    ImportJob.objects.using(self.using).filter(
+                        pk=self.import_job.pk
+                    ).update(heartbeat_at=timezone.now())
+            finally:
+                connections[self.using].close()
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _process_parallel(self, rows):
+        # The row stream is parsed once and spilled to disk in row-range
+        # partitions, which worker processes then validate and upsert.
+        # Partitions commit in any order, so a SKU that appears more than
+        # once is only written from its last valid row; earlier occurrences
+        # are counted as successes without being written, unless that last
+        # row fails (see _write_superseded).
+        superseded_rows = set()
+        fallbacks = {}
+        failed_rows = set()
+
+        with tempfile.TemporaryDirectory(prefix="import-") as spill_dir:
+            with self.profiler.stage("read"), self._heartbeat():
+                partitions = self._spill_partitions(
+                    spill_dir, rows, superseded_rows, fallbacks
                 )
-                success_count += chunk_success
-                warning_count += chunk_warning
-                error_count += chunk_error
-
-            self.import_job.status = "completed"
-            self.import_job.total_rows = total_rows
-            self.import_job.success_count = success_count
-            self.import_job.warning_count = warning_count
-            self.import_job.error_count = error_count
-            self.import_job.save()
 
-        except Exception as e:
-            self.import_job.status = "failed"
-            self.import_job.save()
-            raise
+            # Forked workers must open their own database connections.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("fork"),
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _process_partition,
+                        self.import_job.id,
+                        self.using,
+                        path,
+                        first_row_num,
+                        {
+                            row_num
+                            for row_num in superseded_rows
+                            if first_row_num <= row_num <= last_row_num
+                        },
+                    )
+                    for path, first_row_num, last_row_num in partitions
+                ]
+                for future in as_completed(futures):
+                    profile, partition_failed_rows, peak_rss = future.result()
+                    self.profiler.merge(profile)
+                    self.chunk_sizer.merge(profile["chunk_sizes"])
+                    failed_rows |= partition_failed_rows
+                    self.worker_peak_rss = max(self.worker_peak_rss or 0, peak_rss)
+
+            with self.profiler.stage("write"):
+                self._write_superseded(partitions, fallbacks, failed_rows)
+
+    def _spill_partitions(self, spill_dir, rows, superseded_rows, fallbacks):
+        # Fills superseded_rows with the earlier valid rows of repeated SKUs,
+        # and fallbacks with {last_row_num: [earlier row_nums]}.
+        latest_rows = {}
+        earlier_rows = {}
+        partitions = []
+        partition = []
+        first_row_num = 2
+        for row_num, row in enumerate(rows, start=2):
+            if not ProductValidator.validate_required_fields(row, row_num):
+                # The SKU as it is stored, so 123 and "123" are one product.
+                sku = str(row[SKU_INDEX])
+                if sku in latest_rows:
+                    earlier_rows.setdefault(sku, []).append(latest_rows[sku])
+                latest_rows[sku] = row_num
+
+            partition.append(row)
+            if len(partition) == self.partition_size:
+                partitions.append(
+                    self._spill_partition(spill_dir, partition, first_row_num)
+                )
+                first_row_num = row_num + 1
+                partition = []
+
+        if partition:
+            partitions.append(
+                self._spill_partition(spill_dir, partition, first_row_num)
+            )
+
+        for sku, row_nums in earlier_rows.items():
+            superseded_rows.update(row_nums)
+            fallbacks[latest_rows[sku]] = row_nums
+        return partitions
+
+    def _spill_partition(self, spill_dir, rows, first_row_num):
+        path = os.path.join(spill_dir, f"rows-{first_row_num}.pickle")
+        with open(path, "wb") as partition_file:
+            pickle.dump(rows, partition_file, protocol=pickle.HIGHEST_PROTOCOL)
+        return path, first_row_num, first_row_num + len(rows) - 1
+
+    def _write_superseded(self, partitions, fallbacks, failed_rows):
+        # Earlier rows of a SKU whose last row could not be written were
+        # counted as successes but never written. They are written one by one
+        # in file order, as sequential imports would have, so the last of
+        # them that succeeds is the one kept.
+        retry_rows = {
+            row_num
+            for last_row_num in failed_rows & fallbacks.keys()
+            for row_num in fallbacks[last_row_num]
+        }
+        if not retry_rows:
+            return
 
-    def _process_chunk(self, chunk, last_row_num):
+        error_count = 0
+        with transaction.atomic(using=self.using):
+            for path, first_row_num, last_row_num in partitions:
+                row_nums = sorted(
+                    row_num
+                    for row_num in retry_rows
+                    if first_row_num <= row_num <= last_row_num
+                )
+                if not row_nums:
+                    continue
+                with open(path, "rb") as partition_file:
+                    rows = pickle.load(partition_file)
+
+                for row_num in row_nums:
+                    product_data = self._build_product_data(
+                        rows[row_num - first_row_num]
+                    )
+                    try:
+                        with transaction.atomic(using=self.using):
+                            self._create_product(product_data)
+                    except OperationalError:
+                        raise
+                    except Exception as e:
+                        error_count += 1
+                        self._log_error(row_num, str(e))
+
+            self.log_buffer.flush()
+            if error_count:
+                self._record_progress(
+                    success_count=-error_count, error_count=error_count
+                )
+
+    def _process_partition(self, rows, first_row_num, superseded_rows):
+        start = 0
+        while start < len(rows):
+            chunk = rows[start : start + self.chunk_sizer.size]
+            self._process_chunk(
+                chunk, first_row_num + start + len(chunk) - 1, superseded_rows
+            )
+            start += len(chunk)
+
+    def _process_chunk(self, chunk, last_row_num, superseded_rows=()):
+        with self.profiler.stage("validate"):
+            validations = self._validate_chunk(chunk, last_row_num)
+
+        validated_rows = []
+        with self.profiler.stage("transform"):
+            for index, (row, (errors, warnings)) in enumerate(zip(chunk, validations)):
+                row_num = last_row_num - len(chunk) + index + 1
+                product_data = None if errors else self._build_product_data(row)
+                validated_rows.append((row_num, product_data, errors, warnings))
+
+        # A chunk whose transaction fails on a lock timeout, deadlock or
+        # serialization failure is rolled back and retried; rows the
+        # database rejects are handled inside the transaction instead. Only
+        # such failures halve the chunk size, and latency is measured up to
+        # the commit.
+        first_row = last_row_num - len(chunk) + 1
+        for attempt in range(self.chunk_retries + 1):
+            pending_logs = self.log_buffer.snapshot()
+            started = time.perf_counter()
+            try:
+                write_errors = self._commit_chunk(
+                    validated_rows, last_row_num, superseded_rows
+                )
+            except Exception as error:
+                # Entries logged for the rolled-back chunk go with it, so
+                # the final flush in process() cannot write them.
+                self.log_buffer.restore(pending_logs)
+                if not isinstance(error, OperationalError):
+                    raise
+                self.chunk_sizer.retry(first_row, len(chunk))
+                if attempt == self.chunk_retries:
+                    raise
+                continue
+            break
+        self.chunk_sizer.observe(first_row, len(chunk), time.perf_counter() - started)
+        self.failed_rows.update(write_errors)
+
+        self.profiler.chunks += 1
+        if self.memory_monitor:
+            # With DEBUG on, Django keeps every SQL statement it ran;
+            # bulk upserts make those entries large.
+            reset_queries()
+            self.memory_monitor.sample()
+
+    def _commit_chunk(self, validated_rows, last_row_num, superseded_rows):
+        # Products, log entries and progress for the chunk are committed
+        # together, so a chunk costs one commit however many rows it has.
+        # Returns the rows the database rejected.
         success_count = 0
+        unchanged_count = 0
         warning_count = 0
         error_count = 0
 
+        with transaction.atomic(using=self.using):
+            with self.profiler.stage("write"):
+                write_errors, unchanged_rows = self._write_products(
+                    [
+                        (row_num, product_data)
+                        for row_num, product_data, errors, warnings in validated_rows
+                        if not errors and row_num not in superseded_rows
+                    ]
+                )
+
+            # Progress bookkeeping is counted as part of the log stage.
+            with self.profiler.stage("log"):
+                warning_rows = {}
+                for row_num, product_data, errors, warnings in validated_rows:
+                    if row_num in write_errors:
+                        errors = [write_errors[row_num]]
+
+                    if errors:
+                        error_count += 1
+                        for error in errors:
+                            self._log_error(row_num, error)
+                        continue
+
+                    if row_num in unchanged_rows:
+                        unchanged_count += 1
+                    elif self.copy_writer is None:
+                        # Staged rows are counted by _process_copy.
+                        success_count += 1
+                    for warning in warnings:
+                        warning_count += 1
+                        if self.summarize_warnings:
+                            warning_rows.setdefault(warning, RowRanges()).add(row_num)
+                        else:
+                            self._log_warning(row_num, warning)
+
+                for warning, rows in warning_rows.items():
+                    self._log_warning_summary(warning, rows)
+                self.log_buffer.flush()
+                self._record_progress(
+                    last_committed_row=last_row_num if self.checkpoints else None,
+                    total_rows=len(validated_rows),
+                    success_count=success_count,
+                    unchanged_count=unchanged_count,
+                    warning_count=warning_count,
+                    error_count=error_count,
+                )
+
+        return write_errors
+
+    def _validate_chunk(self, chunk, last_row_num):
+        # Returns one (errors, warnings) pair per row.
+        if self.validation_mode == "columnar":
+            frame = pd.DataFrame(chunk, columns=FEED_COLUMNS, dtype=object)
+            return ProductValidator.validate_frame(frame)
+
+        validations = []
         for index, row in enumerate(chunk):
             row_num = last_row_num - len(chunk) + index + 1
-            row_data = dict(zip(self._get_headers(), row))
+            errors = ProductValidator.validate_required_fields(row, row_num)
+            warnings = ProductValidator.validate_warning_fields(row, row_num)
+            warnings.extend(ProductValidator.validate_price(row, row_num))
+            validations.append((errors, warnings))
+        return validations
 
-            errors = ProductValidator.validate_required_fields(row_data, row_num)
-            warnings = ProductValidator.validate_warning_fields(row_data, row_num)
-            price_warnings = ProductValidator.validate_price(row_data, row_num)
-            warnings.extend(price_warnings)
+    def _record_progress(self, last_committed_row=None, **counts):
+        # One UPDATE ... SET field = field + n per chunk. It is safe with
+        # several partition workers and doubles as the worker heartbeat.
+        # It runs in the chunk transaction, so the checkpoint only moves
+        # when the chunk's products and logs are committed with it.
+        now = timezone.now()
+        values = {field: F(field) + value for field, value in counts.items()}
+        if last_committed_row is not None:
+            values["last_committed_row"] = last_committed_row
+        ImportJob.objects.using(self.using).filter(pk=self.import_job.pk).update(
+            heartbeat_at=now, updated_at=now, **values
+        )
 
-            if errors:
-                error_count += 1
-                for error in errors:
-                    self._log_error(row_num, error)
-                continue
+    def _write_products(self, rows):
+        # Upserts the whole chunk in one statement. Returns
+        # ({row_num: message}, unchanged_row_nums): the rows that could not
+        # be written, and the rows skipped because the stored product
+        # already has the same fingerprint. Runs inside the chunk
+        # transaction; a failed write is bisected under savepoints until the
+        # rows that cause it are isolated, and the rest are still written.
+        if not rows:
+            return {}, set()
+        if self.copy_writer is not None:
+            return self.copy_writer.stage(rows), set()
 
-            try:
-                with transaction.atomic():
-                    product = self._create_product(row_data)
-                    success_count += 1
+        # Later rows win when a SKU repeats inside the chunk, as they would
+        # with one update_or_create per row.
+        latest = {}
+        for row_num, product_data in rows:
+            latest[product_data["sku"]] = (row_num, product_data)
 
-                    for warning in warnings:
-                        warning_count += 1
-                        self._log_warning(row_num, warning)
-
-            except Exception as e:
-                error_count += 1
-                self._log_error(row_num, str(e))
-
-        return success_count, warning_count, error_count
-
-    def _get_headers(self):
-        return [
-            "id",
-            "title",
-            "image_link",
-            "description",
-            "link",
-            "price",
-            "sale_price",
-            "shipping",
-            "item_group_id",
-            "availability",
-            "additional_image_link",
-            "brand",
-            "gtin",
-            "gender",
-            "google_product_category",
-            "product_type",
-            "material",
-            "pattern",
-            "color",
-            "product_length",
-            "product_width",
-            "product_height",
-            "product_weight",
-            "size",
-            "lifestyle_image_link",
-            "max_handling_time",
-            "is_bundle",
-            "Model",
-            "condition",
-        ]
-
-    def _create_product(self, row_data):
+        existing = {
+            sku: (product_id, fingerprint)
+            for sku, product_id, fingerprint in Product.objects.using(self.using)
+            .filter(sku__in=latest)
+            .values_list("sku", "id", "fingerprint")
+        }
+        unchanged_rows = set()
+        products = []
+        for sku, (row_num, product_data) in latest.items():
+            product = Product(**product_data)
+            if sku in existing:
+                product.id, fingerprint = existing[sku]
+                if fingerprint == product_data["fingerprint"]:
+                    unchanged_rows.add(row_num)
+                    continue
+            products.append((row_num, product))
+
+        errors = {}
+        self._write_bisect(products, existing, errors)
+        if errors:
+            # Earlier rows for a SKU whose last row failed would still have
+            # been written one by one, so they are retried in file order.
+            failed_skus = {
+                product_data["sku"]
+                for row_num, product_data in rows
+                if row_num in errors
+            }
+            for row_num, product_data in rows:
+                if product_data["sku"] in failed_skus and row_num not in errors:
+                    try:
+                        with transaction.atomic(using=self.using):
+                            self._create_product(product_data)
+                    except OperationalError:
+                        raise
+                    except Exception as e:
+                        errors[row_num] = str(e)
+
+        return errors, unchanged_rows
+
+    def _write_bisect(self, products, existing, errors):
+        if not products:
+            return
+        try:
+            with transaction.atomic(using=self.using):
+                self._bulk_upsert([product for row_num, product in products], existing)
+        except OperationalError:
+            # Lock timeouts and the like fail the whole chunk transaction.
+            raise
+        except Exception as e:
+            if len(products) == 1:
+                errors[products[0][0]] = str(e)
+                return
+            middle = len(products) // 2
+            self._write_bisect(products[:middle], existing, errors)
+            self._write_bisect(products[middle:], existing, errors)
+
+    def _bulk_upsert(self, products, existing):
+        if not products:
+            return
+
+        update_fields = [field for field in PRODUCT_FIELDS if field != "sku"]
+        update_fields += ["fingerprint", "updated_at"]
+
+        if self.connection.features.supports_update_conflicts_with_target:
+            Product.objects.using(self.using).bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=update_fields,
+            )
+            return
+
+        Product.objects.using(self.using).bulk_create(
+            [product for product in products if product.sku not in existing]
+        )
+        Product.objects.using(self.using).bulk_update(
+            [product for product in products if product.sku in existing],
+            update_fields,
+        )
+
+    def _build_product_data(self, row):
         def preprocess_price(price_str):
 
             if not price_str:
                 return None
             try:
-                return float(price_str.replace(",", "").split()[0])
-            except (ValueError, AttributeError):
+                return float(ProductValidator.price_token(price_str))
+            except ValueError:
                 return None
 
-        product_data = {
-            "sku": row_data["id"],
-            "title": row_data["title"],
-            "description": row_data["description"],
-            "link": row_data["link"],
-            "image_link": row_data["image_link"],
-            "availability": row_data["availability"],
-            "price": preprocess_price(row_data["price"]),
-            "condition": row_data["condition"],
-            "brand": row_data["brand"],
-            "gtin": row_data["gtin"],
-            "sale_price": preprocess_price(row_data.get("sale_price")),
-            "item_group_id": row_data.get("item_group_id"),
-            "google_product_category": row_data.get("google_product_category"),
-            "product_type": row_data.get("product_type"),
-            "size": row_data.get("size"),
-            "color": row_data.get("color"),
-            "material": row_data.get("material"),
-            "pattern": row_data.get("pattern"),
-            "gender": row_data.get("gender"),
-            "model": row_data.get("Model"),
-        }
+        product_data = {field: row[index] for field, index in PRODUCT_COLUMN_INDICES}
+        product_data["price"] = preprocess_price(product_data["price"])
+        product_data["sale_price"] = preprocess_price(product_data["sale_price"])
 
         for key, value in product_data.items():
             if isinstance(value, str) and not value.strip():
                 product_data[key] = None
 
-        product, created = Product.objects.update_or_create(
+        # Stored SKUs are strings, so numeric id cells must match them.
+        product_data["sku"] = str(product_data["sku"])
+        product_data["fingerprint"] = product_fingerprint(product_data)
+        return product_data
+
+    def _create_product(self, product_data):
+        product, created = Product.objects.using(self.using).update_or_create(
             sku=product_data["sku"], defaults=product_data
         )
         return product
 
     def _log_error(self, row_num, message):
-        ImportLog.objects.create(
-            job=self.import_job, log_type="error", row_number=row_num, message=message
-        )
+        self.log_buffer.add("error", message, row_number=row_num)
 
     def _log_warning(self, row_num, message):
-        ImportLog.objects.create(
-            job=self.import_job, log_type="warning", row_number=row_num, message=message
+        self.log_buffer.add("warning", message, row_number=row_num)
+
+    def _log_warning_summary(self, warning, rows):
+        noun = "row" if rows.count == 1 else "rows"
+        self.log_buffer.add(
+            "warning",
+            f"{warning} ({rows.count} {noun}: {rows.describe()})",
+            row_number=rows.first,
+            details={"warning": warning, "count": rows.count, "rows": rows.ranges},
         )
+
+    def _merge_warning_summaries(self):
+        # Every chunk logs a summary per warning, so that summaries commit
+        # with their rows. When the job ends they are merged into one entry
+        # per warning, including the summaries a resumed job logged before
+        # it stopped and those of partition workers.
+        summaries = ImportLog.objects.using(self.using).filter(
+            job=self.import_job, log_type="warning", details__isnull=False
+        )
+        ranges = {}
+        entries = 0
+        for details in summaries.values_list("details", flat=True).iterator():
+            entries += 1
+            ranges.setdefault(details["warning"], []).extend(details["rows"])
+        if entries == len(ranges):
+            return
+
+        with transaction.atomic(using=self.using):
+            summaries.delete()
+            merged = [(RowRanges(rows), warning) for warning, rows in ranges.items()]
+            for rows, warning in sorted(merged, key=lambda item: item[0].first):
+                self._log_warning_summary(warning, rows)
+            self.log_buffer.flush()
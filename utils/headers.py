@@ -0,0 +1,114 @@
+import operator
+import re
+
+FEED_COLUMNS = [
+    "id",
+    "title",
+    "image_link",
+    "description",
+    "link",
+    "price",
+    "sale_price",
+    "shipping",
+    "item_group_id",
+    "availability",
+    "additional_image_link",
+    "brand",
+    "gtin",
+    "gender",
+    "google_product_category",
+    "product_type",
+    "material",
+    "pattern",
+    "color",
+    "product_length",
+    "product_width",
+    "product_height",
+    "product_weight",
+    "size",
+    "lifestyle_image_link",
+    "max_handling_time",
+    "is_bundle",
+    "model",
+    "condition",
+]
+COLUMN_INDEX = {column: index for index, column in enumerate(FEED_COLUMNS)}
+REQUIRED_COLUMNS = [
+    "id",
+    "title",
+    "description",
+    "link",
+    "image_link",
+    "availability",
+    "price",
+    "condition",
+    "brand",
+    "gtin",
+]
+HEADER_ALIASES = {
+    "sku": "id",
+    "product_id": "id",
+    "name": "title",
+    "url": "link",
+    "product_link": "link",
+    "image_url": "image_link",
+    "additional_image_links": "additional_image_link",
+    "model_number": "model",
+}
+
+
+class HeaderError(ValueError):
+    pass
+
+
+def normalize_header(header):
+    # "Image Link", "image-link" and "IMAGE_LINK" all become "image_link".
+    name = re.sub(r"[\s\-]+", "_", str(header).strip().lower())
+    return HEADER_ALIASES.get(name, name)
+
+
+class HeaderMap:
+    # Resolves a feed's header row once. Calling the map with a data row
+    # returns a tuple in FEED_COLUMNS order, so the rest of the pipeline can
+    # address values by position.
+
+    def __init__(self, header_row):
+        positions = {}
+        unknown = []
+        duplicates = []
+        for position, header in enumerate(header_row):
+            if header is None or not str(header).strip():
+                continue
+
+            column = normalize_header(header)
+            if column not in COLUMN_INDEX:
+                unknown.append(str(header))
+            elif column in positions:
+                duplicates.append(str(header))
+            else:
+                positions[column] = position
+
+        missing = [column for column in REQUIRED_COLUMNS if column not in positions]
+        problems = []
+        if missing:
+            problems.append(f"missing required columns: {', '.join(missing)}")
+        if unknown:
+            problems.append(f"unknown columns: {', '.join(unknown)}")
+        if duplicates:
+            problems.append(f"duplicate columns: {', '.join(duplicates)}")
+        if problems:
+            raise HeaderError(f"Invalid header row ({'; '.join(problems)})")
+
+        # Optional columns absent from the file read the padding slot just
+        # past the last header, which is always None.
+        indices = [positions.get(column, len(header_row)) for column in FEED_COLUMNS]
+        self.width = max(indices) + 1
+        self.missing_columns = [
+            column for column in FEED_COLUMNS if column not in positions
+        ]
+        self._getter = operator.itemgetter(*indices)
+
+    def __call__(self, row):
+        if len(row) < self.width:
+            row = row + (None,) * (self.width - len(row))
+        return self._getter(row)
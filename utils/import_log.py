@@ -0,0 +1,39 @@
+from django.db import DEFAULT_DB_ALIAS
+
+from importer.models import ImportLog
+
+
+class ImportLogBuffer:
+    def __init__(self, import_job, buffer_size=500, using=DEFAULT_DB_ALIAS):
+        self.import_job = import_job
+        self.buffer_size = buffer_size
+        self.using = using
+        self._pending = []
+
+    def add(self, log_type, message, row_number=None, details=None):
+        self._pending.append(
+            ImportLog(
+                job=self.import_job,
+                log_type=log_type,
+                row_number=row_number,
+                message=message,
+                details=details,
+            )
+        )
+        if len(self._pending) >= self.buffer_size:
+            self.flush()
+
+    def snapshot(self):
+        # The entries not yet written, for restore() after a rollback
+        # discarded the ones flushed inside the transaction.
+        return list(self._pending)
+
+    def restore(self, snapshot):
+        self._pending = snapshot
+
+    def flush(self):
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        ImportLog.objects.using(self.using).bulk_create(pending)
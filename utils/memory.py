@@ -0,0 +1,127 @@
+import resource
+import sys
+import tracemalloc
+
+
+def _status_kb(field):
+    # Reads a "<field>: <n> kB" line from /proc/self/status (Linux only).
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM, so the next reading covers only
+    # this job rather than the whole life of a long-running worker. Returns
+    # False where that is not supported.
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_bytes():
+    peak_kb = _status_kb("VmHWM")
+    if peak_kb is None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    return peak_kb * 1024
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def intern_columns(row, indices):
+    # Repeated categorical strings (brand, availability, ...) then share a
+    # single object across every buffered row.
+    row = list(row)
+    for index in indices:
+        value = row[index]
+        if type(value) is str:
+            row[index] = sys.intern(value)
+    return tuple(row)
+
+
+class MemoryMonitor:
+    def __init__(self, budget_bytes=None, trace=False, top=5):
+        self.budget_bytes = budget_bytes
+        self.trace = trace
+        self.top = top
+        self._started_tracing = False
+        self._peak_reset = False
+        self._snapshot = None
+        self._snapshot_size = 0
+
+    def start(self):
+        self._peak_reset = reset_peak_rss()
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def sample(self):
+        # Called between chunks. A snapshot is only taken when traced memory
+        # has grown by a tenth since the last one, so the allocators reported
+        # are the ones live near the peak rather than whatever is left at
+        # the end of the job.
+        if not tracemalloc.is_tracing():
+            return
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self._snapshot_size * 1.1:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = current
+
+    def stop(self, worker_peak_rss=None):
+        # Returns (message, over_budget) describing peak memory for the job.
+        # ``worker_peak_rss`` is the largest peak the job's partition workers
+        # reported for themselves.
+        peak_rss = peak_rss_bytes()
+        parts = [
+            f"Peak RSS {format_bytes(peak_rss)}"
+            + ("" if self._peak_reset else " (process lifetime)")
+        ]
+
+        if worker_peak_rss:
+            parts.append(f"largest worker process {format_bytes(worker_peak_rss)}")
+
+        if self.budget_bytes:
+            parts.append(f"budget {format_bytes(self.budget_bytes)}")
+
+        if tracemalloc.is_tracing():
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            parts.append(f"traced Python peak {format_bytes(traced_peak)}")
+            snapshot = self._snapshot or tracemalloc.take_snapshot()
+            statistics = snapshot.filter_traces(
+                [
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ]
+            ).statistics("lineno")
+            if statistics[: self.top]:
+                parts.append(
+                    "top allocators: "
+                    + "; ".join(
+                        f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} "
+                        f"{format_bytes(stat.size)}"
+                        for stat in statistics[: self.top]
+                    )
+                )
+            self._snapshot = None
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+        over_budget = bool(self.budget_bytes) and peak_rss > self.budget_bytes
+        return ", ".join(parts), over_budget
@@ -1,23 +1,97 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+from datetime import datetime
+from uuid import UUID
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
-class LogPagination(PageNumberPagination):
+class LogCursorPagination(BasePagination):
+    # Keyset pagination over (created_at, id). The cursor is the last row of
+    # the previous page, so each page is one indexed range scan however deep
+    # the client has paged, and no row is repeated. created_at is set when
+    # a row is written, not when it commits: rows of a single writer become
+    # visible in order, but the partition workers of a parallel job commit
+    # in any order, so paging such a job while it runs can miss rows that
+    # commit behind the cursor. Pages of a finished job are complete.
     page_size = 10
     page_size_query_param = "page_size"
     max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by("created_at", "id")
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            # The redundant created_at__gte bounds the index range scan; the
+            # OR on its own would not.
+            queryset = queryset.filter(created_at__gte=created_at).filter(
+                Q(created_at__gt=created_at) | Q(pk__gt=pk)
+            )
+
+        # One extra row tells us whether there is a next page.
+        page = list(queryset[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[: self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, cursor):
+        try:
+            created_at, pk = (
+                base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            )
+            return datetime.fromisoformat(created_at), UUID(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, log):
+        position = f"{log.created_at.isoformat()}|{log.pk}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(self.page[-1])
+        )
 
     def get_paginated_response(self, data):
         return Response(
             {
-                "links": {
-                    "next": self.get_next_link(),
-                    "previous": self.get_previous_link(),
-                },
-                "total_pages": self.page.paginator.num_pages,
-                "total_items": self.page.paginator.count,
-                "current_page": self.page.number,
+                "links": {"next": self.get_next_link()},
                 "page_size": self.page_size,
                 "results": data,
             }
         )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["links", "page_size", "results"],
+            "properties": {
+                "links": {
+                    "type": "object",
+                    "properties": {
+                        "next": {"type": "string", "format": "uri", "nullable": True}
+                    },
+                },
+                "page_size": {"type": "integer"},
+                "results": schema,
+            },
+        }
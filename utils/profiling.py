@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+
+
+class StageProfiler:
+    # Accumulates wall-clock and CPU seconds per pipeline stage. Installed
+    # as a connection.execute_wrapper it also counts the queries, and the
+    # time spent in them, for whichever stage is running.
+
+    def __init__(self):
+        self.stages = {}
+        self.chunks = 0
+        self._current = None
+
+    @contextmanager
+    def stage(self, name):
+        previous, self._current = self._current, name
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_started
+            cpu = time.process_time() - cpu_started
+            self._current = previous
+
+            stats = self._stats(name)
+            stats["calls"] += 1
+            stats["wall"] += wall
+            stats["cpu"] += cpu
+            stats["max_wall"] = max(stats["max_wall"], wall)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats = self._stats(self._current or "other")
+            stats["queries"] += 1
+            stats["query_time"] += time.perf_counter() - started
+
+    def _stats(self, name):
+        if name not in self.stages:
+            self.stages[name] = {
+                "calls": 0,
+                "wall": 0.0,
+                "cpu": 0.0,
+                "max_wall": 0.0,
+                "queries": 0,
+                "query_time": 0.0,
+            }
+        return self.stages[name]
+
+    def merge(self, profile):
+        # Folds in a profile produced by another process (see as_dict).
+        self.chunks += profile["chunks"]
+        for name, other in profile["stages"].items():
+            stats = self._stats(name)
+            for key, value in other.items():
+                if key == "max_wall":
+                    stats[key] = max(stats[key], value)
+                else:
+                    stats[key] += value
+
+    def as_dict(self):
+        return {
+            "chunks": self.chunks,
+            "stages": {
+                name: {
+                    key: value if key in ("calls", "queries") else round(value, 6)
+                    for key, value in stats.items()
+                }
+                for name, stats in self.stages.items()
+            },
+        }
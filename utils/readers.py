@@ -0,0 +1,309 @@
+import csv
+import gzip
+import posixpath
+import zipfile
+from itertools import chain, islice
+from xml.etree.ElementTree import iterparse
+
+from django.conf import settings
+from openpyxl import load_workbook
+
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NS = (
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+)
+PACKAGE_RELATIONSHIP_NS = (
+    "{http://schemas.openxmlformats.org/package/2006/relationships}"
+)
+
+
+class BaseReader:
+    # Readers yield every row of the first (active) sheet as a plain tuple,
+    # starting with the header row. ``expected_rows`` is the number of data
+    # rows when the file declares it, otherwise None. ``skip_rows`` data rows
+    # after the header are left out, which is how resumed imports seek past
+    # rows that were already committed.
+
+    expected_rows = None
+
+    def __init__(self, path):
+        self.path = path
+
+    def iter_rows(self, skip_rows=0):
+        raise NotImplementedError("subclasses of BaseReader must provide iter_rows()")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class OpenpyxlReader(BaseReader):
+    def __init__(self, path):
+        super().__init__(path)
+        self.workbook = load_workbook(path, read_only=True)
+        self.sheet = self.workbook.active
+        if self.sheet.max_row:
+            self.expected_rows = self.sheet.max_row - 1
+
+    def iter_rows(self, skip_rows=0):
+        if not skip_rows:
+            return self.sheet.iter_rows(values_only=True)
+        return chain(
+            self.sheet.iter_rows(max_row=1, values_only=True),
+            self.sheet.iter_rows(min_row=skip_rows + 2, values_only=True),
+        )
+
+    def close(self):
+        self.workbook.close()
+
+
+class XlsxStreamReader(BaseReader):
+    # Streams the worksheet XML straight out of the zip with iterparse,
+    # without building openpyxl cell objects. Values match openpyxl's
+    # values_only output, with two exceptions: formulas return their cached
+    # result instead of the formula text, and date-formatted numbers are
+    # returned as numbers because cell styles are not read.
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.archive = zipfile.ZipFile(path)
+        self.sheet_path = self._active_sheet_path()
+        self.shared_strings = self._read_shared_strings()
+        self.max_column = None
+        self._read_dimension()
+
+    def close(self):
+        self.archive.close()
+
+    def iter_rows(self, skip_rows=0):
+        row_tag = f"{SHEET_NS}row"
+        cell_tag = f"{SHEET_NS}c"
+        sheet_data_tag = f"{SHEET_NS}sheetData"
+        shared_strings = self.shared_strings
+        width = self.max_column
+        column_indices = {}
+        next_row = 1
+        first_data_row = skip_rows + 2
+        sheet_data = None
+
+        with self.archive.open(self.sheet_path) as sheet_xml:
+            for event, element in iterparse(sheet_xml, events=("start", "end")):
+                if event == "start":
+                    if element.tag == sheet_data_tag:
+                        sheet_data = element
+                    continue
+                if element.tag != row_tag:
+                    continue
+
+                row_number = element.get("r")
+                row_number = int(row_number) if row_number else next_row
+                # openpyxl yields empty rows for row numbers the file skips.
+                while next_row < row_number:
+                    if next_row == 1 or next_row >= first_data_row:
+                        yield (None,) * (width or 0)
+                    next_row += 1
+                next_row = row_number + 1
+
+                # Skipped rows are still tokenized by the XML parser, but
+                # their cells are never decoded.
+                if 1 < row_number < first_data_row:
+                    element.clear()
+                    continue
+
+                values = []
+                for cell in element:
+                    if cell.tag != cell_tag:
+                        continue
+
+                    reference = cell.get("r")
+                    if reference:
+                        letters = reference.rstrip("0123456789")
+                        index = column_indices.get(letters)
+                        if index is None:
+                            index = column_indices[letters] = _column_index(letters)
+                        if index > len(values):
+                            values.extend([None] * (index - len(values)))
+
+                    values.append(_cell_value(cell, shared_strings))
+
+                if width is not None:
+                    if len(values) < width:
+                        values.extend([None] * (width - len(values)))
+                    elif len(values) > width:
+                        del values[width:]
+
+                yield tuple(values)
+
+                # Drop parsed rows so memory stays flat on large sheets.
+                element.clear()
+                if sheet_data is not None:
+                    sheet_data.clear()
+
+    def _active_sheet_path(self):
+        with self.archive.open("xl/workbook.xml") as workbook_xml:
+            active_tab = 0
+            sheet_ids = []
+            for _, element in iterparse(workbook_xml):
+                if element.tag == f"{SHEET_NS}workbookView":
+                    active_tab = int(element.get("activeTab", 0))
+                elif element.tag == f"{SHEET_NS}sheet":
+                    sheet_ids.append(element.get(f"{RELATIONSHIP_NS}id"))
+
+        with self.archive.open("xl/_rels/workbook.xml.rels") as rels_xml:
+            targets = {
+                element.get("Id"): element.get("Target")
+                for _, element in iterparse(rels_xml)
+                if element.tag == f"{PACKAGE_RELATIONSHIP_NS}Relationship"
+            }
+
+        target = targets[sheet_ids[min(active_tab, len(sheet_ids) - 1)]]
+        if target.startswith("/"):
+            return target.lstrip("/")
+        return posixpath.normpath(posixpath.join("xl", target))
+
+    def _read_shared_strings(self):
+        if "xl/sharedStrings.xml" not in self.archive.namelist():
+            return []
+
+        strings = []
+        item_tag = f"{SHEET_NS}si"
+        with self.archive.open("xl/sharedStrings.xml") as strings_xml:
+            for _, element in iterparse(strings_xml):
+                if element.tag == item_tag:
+                    strings.append(_text_content(element).replace("x005F_", ""))
+                    element.clear()
+        return strings
+
+    def _read_dimension(self):
+        # The <dimension> element sits before <sheetData>, so only the start
+        # of the sheet is parsed.
+        dimension_tag = f"{SHEET_NS}dimension"
+        with self.archive.open(self.sheet_path) as sheet_xml:
+            for event, element in iterparse(sheet_xml, events=("start",)):
+                if element.tag == dimension_tag:
+                    self._apply_dimension(element.get("ref", ""))
+                    return
+                if element.tag == f"{SHEET_NS}sheetData":
+                    return
+
+    def _apply_dimension(self, ref):
+        if ":" not in ref:
+            return
+
+        last_cell = ref.split(":")[1]
+        letters = last_cell.rstrip("0123456789")
+        digits = last_cell[len(letters) :]
+        self.max_column = _column_index(letters) + 1
+        if digits:
+            self.expected_rows = int(digits) - 1
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _text_content(element):
+    # Plain <t> text plus rich-text runs, skipping phonetic hints (<rPh>).
+    text_tag = f"{SHEET_NS}t"
+    run_tag = f"{SHEET_NS}r"
+    parts = []
+    for child in element:
+        if child.tag == text_tag:
+            parts.append(child.text or "")
+        elif child.tag == run_tag:
+            parts.extend(run.text or "" for run in child if run.tag == text_tag)
+    return "".join(parts)
+
+
+def _cell_value(cell, shared_strings):
+    data_type = cell.get("t", "n")
+    if data_type == "inlineStr":
+        inline = cell.find(f"{SHEET_NS}is")
+        return None if inline is None else _text_content(inline)
+
+    value = cell.findtext(f"{SHEET_NS}v") or None
+    if value is None:
+        return None
+    if data_type == "n":
+        if "." in value or "E" in value or "e" in value:
+            return float(value)
+        return int(value)
+    if data_type == "s":
+        return shared_strings[int(value)]
+    if data_type == "b":
+        return bool(int(value))
+    return value
+
+
+class CsvReader(BaseReader):
+    # Streams delimited text one line at a time. Empty fields become None so
+    # rows look the same as rows read from a spreadsheet.
+
+    dialect = "excel"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.file = self._open()
+
+    def _open(self):
+        return open(self.path, newline="", encoding="utf-8-sig")
+
+    def iter_rows(self, skip_rows=0):
+        # Quoted fields may span lines, so skipped rows still go through the
+        # csv parser; only the per-value conversion is saved.
+        rows = csv.reader(self.file, dialect=self.dialect)
+        for row in rows:
+            yield tuple([value if value != "" else None for value in row])
+            break
+        for _ in islice(rows, skip_rows):
+            pass
+        for row in rows:
+            yield tuple([value if value != "" else None for value in row])
+
+    def close(self):
+        self.file.close()
+
+
+class TsvReader(CsvReader):
+    dialect = "excel-tab"
+
+
+class GzipCsvReader(CsvReader):
+    def _open(self):
+        return gzip.open(self.path, "rt", newline="", encoding="utf-8-sig")
+
+
+READERS = {
+    "openpyxl": OpenpyxlReader,
+    "stream": XlsxStreamReader,
+}
+
+TEXT_READERS = {
+    ".csv": CsvReader,
+    ".tsv": TsvReader,
+    ".csv.gz": GzipCsvReader,
+}
+
+SUPPORTED_EXTENSIONS = (".xlsx", *TEXT_READERS)
+
+
+def is_supported_file(name):
+    return name.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def get_reader(path, engine=None):
+    lower_path = str(path).lower()
+    for extension, reader_class in TEXT_READERS.items():
+        if lower_path.endswith(extension):
+            return reader_class(path)
+
+    engine = engine or getattr(settings, "IMPORT_XLSX_READER", "openpyxl")
+    return READERS[engine](path)
@@ -0,0 +1,48 @@
+class RowRanges:
+    # A set of row numbers kept as sorted, non-adjacent [first, last] ranges,
+    # so a warning that hits every row of a feed is stored as one pair.
+
+    def __init__(self, ranges=()):
+        self.ranges = []
+        self.count = 0
+        for first, last in sorted(ranges):
+            self._extend(first, last)
+
+    def _extend(self, first, last):
+        if self.ranges and first <= self.ranges[-1][1] + 1:
+            previous = self.ranges[-1]
+            if last > previous[1]:
+                self.count += last - previous[1]
+                previous[1] = last
+            return
+        self.ranges.append([first, last])
+        self.count += last - first + 1
+
+    def add(self, row_num):
+        # Rows are added in ascending order within a chunk.
+        self._extend(row_num, row_num)
+
+    @property
+    def first(self):
+        return self.ranges[0][0]
+
+    def describe(self, limit=10):
+        # "2-50000 except 1234" when most of the span is covered,
+        # "2-10, 20, 30-40" otherwise.
+        gaps = [
+            [previous[1] + 1, current[0] - 1]
+            for previous, current in zip(self.ranges, self.ranges[1:])
+        ]
+        if gaps and sum(last - first + 1 for first, last in gaps) < self.count:
+            span = f"{self.first}-{self.ranges[-1][1]}"
+            return f"{span} except {_format_ranges(gaps, limit)}"
+        return _format_ranges(self.ranges, limit)
+
+
+def _format_ranges(ranges, limit):
+    parts = [
+        str(first) if first == last else f"{first}-{last}" for first, last in ranges
+    ]
+    if len(parts) > limit:
+        parts = parts[:limit] + [f"{len(parts) - limit} more"]
+    return ", ".join(parts)
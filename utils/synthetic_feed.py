@@ -0,0 +1,99 @@
+import csv
+import gzip
+import random
+
+from openpyxl import Workbook
+
+from utils.headers import COLUMN_INDEX, FEED_COLUMNS
+
+FEED_FORMATS = ["xlsx", "csv", "tsv", "csv.gz"]
+
+BRANDS = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark", "Wayne"]
+AVAILABILITY = ["in stock", "out of stock", "preorder", "backorder"]
+CONDITIONS = ["new", "refurbished", "used"]
+GENDERS = ["male", "female", "unisex"]
+COLORS = ["black", "white", "red", "blue", "green", "grey"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+MATERIALS = ["cotton", "wool", "polyester", "leather", "linen"]
+PATTERNS = ["plain", "striped", "checked", "floral"]
+CATEGORIES = ["Apparel & Accessories > Clothing", "Apparel & Accessories > Shoes"]
+
+
+def sku_for(number):
+    return f"BENCH-{number:08d}"
+
+
+class SyntheticFeed:
+    # Generates reproducible rows in FEED_COLUMNS order. Rates are fractions
+    # of all rows: error rows miss a required field, warning rows miss a
+    # recommended one and duplicate rows repeat an earlier SKU.
+
+    def __init__(
+        self, rows, error_rate=0.0, warning_rate=0.0, duplicate_ratio=0.0, seed=0
+    ):
+        self.rows = rows
+        self.error_rate = error_rate
+        self.warning_rate = warning_rate
+        self.duplicate_ratio = duplicate_ratio
+        self.seed = seed
+
+    def make_row(self, number, rng, variant=""):
+        price = rng.randint(500, 50000) / 100
+        row = [None] * len(FEED_COLUMNS)
+        values = {
+            "id": sku_for(number),
+            "title": f"Product {number}{variant}",
+            "description": f"Synthetic product {number} for import benchmarks.",
+            "link": f"https://shop.example.com/p/{number}",
+            "image_link": f"https://cdn.example.com/p/{number}.jpg",
+            "availability": rng.choice(AVAILABILITY),
+            "price": f"{price:.2f} USD",
+            "sale_price": f"{price * 0.8:.2f} USD",
+            "condition": rng.choice(CONDITIONS),
+            "brand": rng.choice(BRANDS),
+            "gtin": f"{4000000000000 + number}",
+            "item_group_id": f"G{number // 5}",
+            "google_product_category": rng.choice(CATEGORIES),
+            "product_type": "Clothing",
+            "size": rng.choice(SIZES),
+            "color": rng.choice(COLORS),
+            "material": rng.choice(MATERIALS),
+            "pattern": rng.choice(PATTERNS),
+            "gender": rng.choice(GENDERS),
+            "model": f"M-{number % 1000}",
+        }
+        for column, value in values.items():
+            row[COLUMN_INDEX[column]] = value
+        return row
+
+    def __iter__(self):
+        rng = random.Random(self.seed)
+        for number in range(self.rows):
+            if number and rng.random() < self.duplicate_ratio:
+                row = self.make_row(rng.randrange(number), rng, variant=" (repeat)")
+            else:
+                row = self.make_row(number, rng)
+
+            roll = rng.random()
+            if roll < self.error_rate:
+                row[COLUMN_INDEX["title"]] = None
+            elif roll < self.error_rate + self.warning_rate:
+                row[COLUMN_INDEX["color"]] = None
+            yield row
+
+    def write(self, path, feed_format):
+        if feed_format == "xlsx":
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            sheet.append(FEED_COLUMNS)
+            for row in self:
+                sheet.append(row)
+            workbook.save(path)
+            return
+
+        opener = gzip.open if feed_format == "csv.gz" else open
+        delimiter = "\t" if feed_format == "tsv" else ","
+        with opener(path, "wt", newline="", encoding="utf-8") as feed:
+            writer = csv.writer(feed, delimiter=delimiter)
+            writer.writerow(FEED_COLUMNS)
+            writer.writerows(self)
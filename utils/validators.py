@@ -1,58 +1,52 @@
-class ProductValidator:
-    @staticmethod
-    def validate_required_fields(row_data, row_num):
-        required_fields = [
-            "id",
-            "title",
-            "description",
-            "link",
-            "image_link",
-            "availability",
-            "price",
-            "condition",
-            "brand",
-            "gtin",
-        ]
-        errors = []
+import numpy as np
+import pandas as pd
 
-        for field in required_fields:
-            if not row_data.get(field):
-                errors.append(f"Missing required field: {field}")
+from utils.headers import COLUMN_INDEX, REQUIRED_COLUMNS
 
-        return errors
+WARNING_COLUMNS = [
+    "sale_price",
+    "item_group_id",
+    "google_product_category",
+    "product_type",
+    "size",
+    "color",
+    "material",
+    "pattern",
+    "gender",
+    "model",
+]
+REQUIRED_CHECKS = [
+    (COLUMN_INDEX[column], f"Missing required field: {column}")
+    for column in REQUIRED_COLUMNS
+]
+WARNING_CHECKS = [
+    (COLUMN_INDEX[column], f"Missing recommended field: {column}")
+    for column in WARNING_COLUMNS
+]
+PRICE_INDEX = COLUMN_INDEX["price"]
+SALE_PRICE_INDEX = COLUMN_INDEX["sale_price"]
 
-    @staticmethod
-    def validate_warning_fields(row_data, row_num):
-        warning_fields = [
-            "sale_price",
-            "item_group_id",
-            "google_product_category",
-            "product_type",
-            "size",
-            "color",
-            "material",
-            "pattern",
-            "gender",
-            "Model",
-        ]
-        warnings = []
 
-        for field in warning_fields:
-            if not row_data.get(field):
-                warnings.append(f"Missing recommended field: {field}")
+class ProductValidator:
+    # Rows are tuples in FEED_COLUMNS order, as produced by HeaderMap.
 
-        return warnings
+    @staticmethod
+    def validate_required_fields(row, row_num):
+        return [message for index, message in REQUIRED_CHECKS if not row[index]]
 
     @staticmethod
-    def validate_price(row_data, row_num):
+    def validate_warning_fields(row, row_num):
+        return [message for index, message in WARNING_CHECKS if not row[index]]
+
+    @staticmethod
+    def validate_price(row, row_num):
         warnings = []
         try:
-            price_str = row_data.get("price", "0").replace(",", "").split()[0]
-            price = float(price_str)
+            price = float(ProductValidator.price_token(row[PRICE_INDEX]))
             if price <= 0:
                 warnings.append("Price should be greater than 0")
 
-            sale_price_str = row_data.get("sale_price", "").replace(",", "").split()[0]
+            sale_price_str = ProductValidator.price_token(row[SALE_PRICE_INDEX])
             if sale_price_str:
                 sale_price = float(sale_price_str)
                 if sale_price <= 0:
@@ -64,3 +58,94 @@ class ProductValidator:
             return ["Invalid price format"]
 
         return warnings
+
+    @staticmethod
+    def price_token(value):
+        # "1,299.00 USD" -> "1299.00". Numeric cells are accepted as-is and
+        # empty cells give "".
+        if value is None:
+            return ""
+        tokens = str(value).replace(",", "").split()
+        return tokens[0] if tokens else ""
+
+    @staticmethod
+    def validate_frame(frame):
+        # Columnar equivalent of the three row validators above. Takes a
+        # DataFrame whose columns are FEED_COLUMNS and returns one
+        # (errors, warnings) pair per row, with the same messages in the
+        # same order as the row-wise path.
+        size = len(frame)
+        errors = [[] for _ in range(size)]
+        warnings = [[] for _ in range(size)]
+
+        for column in REQUIRED_COLUMNS:
+            message = f"Missing required field: {column}"
+            for index in np.flatnonzero(_missing(frame[column])):
+                errors[index].append(message)
+
+        for column in WARNING_COLUMNS:
+            message = f"Missing recommended field: {column}"
+            for index in np.flatnonzero(_missing(frame[column])):
+                warnings[index].append(message)
+
+        price, price_invalid = _parse_prices(_price_tokens(frame["price"]))
+        sale_tokens = _price_tokens(frame["sale_price"])
+        sale_price, sale_invalid = _parse_prices(sale_tokens)
+        has_sale_price = (sale_tokens != "").to_numpy()
+        valid = ~(price_invalid | (has_sale_price & sale_invalid))
+
+        checks = [
+            (valid & (price <= 0), "Price should be greater than 0"),
+            (
+                valid & has_sale_price & (sale_price <= 0),
+                "Sale price should be greater than 0",
+            ),
+            (
+                valid & has_sale_price & (sale_price >= price),
+                "Sale price should be less than regular price",
+            ),
+            (~valid, "Invalid price format"),
+        ]
+        for mask, message in checks:
+            for index in np.flatnonzero(mask):
+                warnings[index].append(message)
+
+        return list(zip(errors, warnings))
+
+
+def _is_none(column):
+    # Only None is an empty cell; a NaN cell is a value, as it is for
+    # `not value` and price_token() in the row path.
+    return np.fromiter((value is None for value in column), bool, len(column))
+
+
+def _missing(column):
+    # Mirrors `not value`: None, empty strings and zeros count as missing.
+    return _is_none(column) | column.isin(["", 0]).to_numpy()
+
+
+def _price_tokens(column):
+    tokens = column.astype(str).str.replace(",", "", regex=False).str.split().str[0]
+    return tokens.where(~_is_none(column), "").fillna("")
+
+
+def _parse_prices(tokens):
+    values = pd.to_numeric(tokens.where(tokens != ""), errors="coerce")
+    invalid = (tokens == "") | values.isna()
+
+    # to_numeric is stricter than float() for a few spellings, so anything
+    # it rejected is re-checked with float() to keep both paths identical.
+    retry = invalid & (tokens != "")
+    if retry.any():
+        parsed = [_float_or_none(token) for token in tokens[retry]]
+        values[retry] = [np.nan if value is None else value for value in parsed]
+        invalid[retry] = [value is None for value in parsed]
+
+    return values.to_numpy(dtype=float), invalid.to_numpy(dtype=bool)
+
+
+def _float_or_none(token):
+    try:
+        return float(token)
+    except ValueError:
+        return None